@@ -21,13 +21,54 @@
 #pragma once
 
 #include <NFParam/ParamEvent.h>
+#include <NFParam/TempoMap.h>
 
+#include <cstddef>
 #include <memory>
 #include <vector>
 
 namespace nativeformat {
 namespace param {
 
+/* The AutomationRate determines how often valuesForTimeRange evaluates a Param.
+ * AUDIO (a-rate) evaluates every value. CONTROL (k-rate) evaluates the first
+ * value of each control block and fills the rest of the block according to
+ * the ControlInterpolation: HOLD repeats it, LINEAR ramps towards the first
+ * value of the next block. Control blocks start at the start_time of each
+ * valuesForTimeRange call.
+ */
+enum class AutomationRate { AUDIO, CONTROL };
+enum class ControlInterpolation { HOLD, LINEAR };
+
+/* The Waveform of an oscillator, such as an LFO modulating other params.
+ * Each waveform oscillates between -1 and 1. SINE, TRIANGLE and SAWTOOTH
+ * start each cycle at 0 and rising, and SQUARE starts each cycle at 1.
+ */
+enum class Waveform { SINE, TRIANGLE, SQUARE, SAWTOOTH };
+
+/* The ScheduleResult of a try* scheduling method, which never throws or
+ * allocates. CONFLICT means the event's anchors overlap an existing event's,
+ * OUT_OF_CAPACITY means the events reserved with reserveEvents ran out,
+ * INVALID_ARGUMENT means a method that throws would have thrown
+ * std::invalid_argument for the same arguments, and TEMPO_MAP_CHANGED means
+ * the events have not been remapped to a change to the tempo map yet, which
+ * the next call that is not a try* method does. Nothing is scheduled unless
+ * the result is SCHEDULED.
+ */
+enum class ScheduleResult {
+  SCHEDULED,
+  CONFLICT,
+  OUT_OF_CAPACITY,
+  INVALID_ARGUMENT,
+  TEMPO_MAP_CHANGED
+};
+
+struct RenderCacheStatistics {
+  size_t hits;
+  size_t misses;
+  size_t cached_values;
+};
+
 class Param {
  public:
   // from WAA spec
@@ -42,12 +83,46 @@ class Param {
   virtual void setValueCurveAtTime(std::vector<float> values,
                                    double start_time,
                                    double duration) = 0;
+  // Schedule a shared curve without copying it; the curve is kept alive by the events using it
+  virtual void setValueCurveAtTime(NF_AUDIO_PARAM_CURVE values,
+                                   double start_time,
+                                   double duration) = 0;
+  // Schedule a value curve simplified to the fewest linear segments that stay within tolerance of
+  // the linear interpolation of values, returning the number of values removed. The tolerance
+  // must be finite and not negative.
+  virtual size_t setSimplifiedValueCurveAtTime(std::vector<float> values,
+                                               double start_time,
+                                               double duration,
+                                               float tolerance) = 0;
+  virtual void cancelScheduledValues(double cancel_time) = 0;
+  virtual void cancelAndHoldAtTime(double cancel_time) = 0;
+
+  // Events scheduled in beats follow the tempo map, and move when it changes. The time constant
+  // of setTargetAtBeat is in seconds, and the values of a curve are spaced evenly in seconds.
+  // Where a tempo change moves events onto each other's required time ranges, the event that
+  // starts first is used and the others are ignored until a tempo change makes room for them.
+  virtual void setTempoMap(std::shared_ptr<TempoMap> tempo_map) = 0;
+  virtual std::shared_ptr<TempoMap> tempoMap() = 0;
+  virtual void setValueAtBeat(float value, double beat) = 0;
+  virtual void linearRampToValueAtBeat(float end_value, double end_beat) = 0;
+  virtual void setTargetAtBeat(float target, double start_beat, float time_constant) = 0;
+  virtual void exponentialRampToValueAtBeat(float value, double end_beat) = 0;
+  virtual void setValueCurveAtBeat(NF_AUDIO_PARAM_CURVE values,
+                                   double start_beat,
+                                   double duration_beats) = 0;
+  virtual float valueForBeat(double beat) = 0;
+  virtual void valuesForBeatRange(float *values,
+                                  size_t values_count,
+                                  double start_beat,
+                                  double end_beat) = 0;
 
   // other methods
   virtual void addCustomEvent(double start_time,
                               double end_time,
                               Anchor anchor,
                               NF_AUDIO_PARAM_FUNCTION function) = 0;
+  // Oscillate at frequency Hz from start_time until the next event
+  virtual void setOscillatorAtTime(Waveform waveform, float frequency, double start_time) = 0;
   virtual float valueForTime(double time) = 0;
   virtual void valuesForTimeRange(float *values,
                                   size_t values_count,
@@ -60,6 +135,51 @@ class Param {
   virtual float cumulativeValueForTimeRange(double start_time,
                                             double end_time,
                                             double precision = 0.1) = 0;
+  virtual AutomationRate automationRate() = 0;
+  virtual void setAutomationRate(
+      AutomationRate rate,
+      size_t control_block_size = 128,
+      ControlInterpolation interpolation = ControlInterpolation::HOLD) = 0;
+
+  // Cache up to max_cached_values rendered values from valuesForTimeRange, keyed on the requested
+  // range. The cache is emptied whenever events change, and is disabled with a capacity of 0.
+  // Custom events must always return the same value for a time to be cached correctly.
+  virtual void setRenderCacheCapacity(size_t max_cached_values) = 0;
+  virtual RenderCacheStatistics renderCacheStatistics() = 0;
+
+  // Create a param with the same events shifted later by time_offset seconds, such as a voice's
+  // envelope from a template param. The events are shared until either param is edited, so cloning
+  // takes constant time. Beats count from the clone's offset, and a clone's time offset is added
+  // to its template's.
+  virtual std::shared_ptr<Param> clone(double time_offset = 0.0) = 0;
+
+  // Add depth * source + offset to this param's values before they are clamped to its range.
+  // valuesForTimeRange renders each source once per range in dependency order, and
+  // cumulativeValueForTimeRange ignores modulation. Connections that would form a cycle throw
+  // std::invalid_argument. Clones keep the connections of the param they were cloned from.
+  virtual void connectModulation(std::shared_ptr<Param> source,
+                                 float depth,
+                                 float offset = 0.0f) = 0;
+  // Remove every connection from source
+  virtual void disconnectModulation(std::shared_ptr<Param> source) = 0;
+
+  // Preallocate room for at least capacity more events. Only the try* methods use this room, and
+  // they never allocate or free memory, so that they can be called from an audio thread. Ramps
+  // take two events. Cancelling returns events to the room rather than freeing them.
+  // tryCancelAndHoldAtTime returns OUT_OF_CAPACITY rather than remove events that were not
+  // scheduled with the try* methods, or the last reference to a shared curve. A clone that shares
+  // its events copies them here rather than on first edit.
+  virtual void reserveEvents(size_t capacity) = 0;
+  virtual ScheduleResult trySetValueAtTime(float value, double time) = 0;
+  virtual ScheduleResult tryLinearRampToValueAtTime(float end_value, double end_time) = 0;
+  virtual ScheduleResult trySetTargetAtTime(float target,
+                                            double start_time,
+                                            float time_constant) = 0;
+  virtual ScheduleResult tryExponentialRampToValueAtTime(float value, double end_time) = 0;
+  virtual ScheduleResult trySetValueCurveAtTime(NF_AUDIO_PARAM_CURVE values,
+                                                double start_time,
+                                                double duration) = 0;
+  virtual ScheduleResult tryCancelAndHoldAtTime(double cancel_time) = 0;
 };
 
 std::shared_ptr<Param> createParam(float default_value,
@@ -67,5 +187,8 @@ std::shared_ptr<Param> createParam(float default_value,
                                    float min_value,
                                    const std::string &name);
 
+// A param oscillating between -1 and 1 from time 0, to connect as a modulation source
+std::shared_ptr<Param> createLFO(Waveform waveform, float frequency, const std::string &name);
+
 }  // namespace param
 }  // namespace nativeformat
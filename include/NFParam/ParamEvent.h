@@ -20,13 +20,18 @@
  */
 #pragma once
 
+#include <cstddef>
 #include <functional>
+#include <memory>
 #include <type_traits>
+#include <vector>
 
 namespace nativeformat {
 namespace param {
 
 typedef std::function<float(double time)> NF_AUDIO_PARAM_FUNCTION;
+// An immutable value curve that can be shared between any number of events and params
+typedef std::shared_ptr<const std::vector<float>> NF_AUDIO_PARAM_CURVE;
 
 /* The ParamEvent Anchor determines whether a ParamEvent is
  * tied to the start time and value, end time and value, or
@@ -44,6 +49,9 @@ struct ParamEvent {
   double start_time;
   double end_time;
   double start_value;
+  // The beats the anchored times were scheduled at, or INVALID_TIME if scheduled in seconds
+  double start_beat;
+  double end_beat;
 
   const Anchor anchor;
 
@@ -51,8 +59,15 @@ struct ParamEvent {
   virtual ~ParamEvent();
 
   virtual float valueAtTime(double time) = 0;
+  // Fill values with the event's value at start_time + i * time_step
+  virtual void valuesAtTime(float *values,
+                            size_t values_count,
+                            double start_time,
+                            double time_step);
   virtual float endValue();
   virtual float cumulativeValue(double start_time, double end_time, double precision = .1);
+  // Copy the event, so that a param can edit events it shares with its clones
+  virtual std::unique_ptr<ParamEvent> clone() const = 0;
 
   static constexpr double INVALID_TIME = -1.0;
 };
@@ -67,6 +82,7 @@ struct CustomParamEvent : public ParamEvent {
 
   virtual ~CustomParamEvent();
   float valueAtTime(double time) override;
+  std::unique_ptr<ParamEvent> clone() const override;
 };
 
 }  // namespace param
@@ -0,0 +1,58 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#pragma once
+
+#include <cstdint>
+#include <memory>
+
+namespace nativeformat {
+namespace param {
+
+/* A TempoMap converts between beats and seconds. The tempo is piecewise
+ * constant or linearly ramped between tempo points, and holds the last
+ * point's tempo after it. The map is compiled into a table of segments when
+ * it changes, so every conversion is a binary search and a closed-form
+ * expression.
+ */
+class TempoMap {
+ public:
+  virtual ~TempoMap() {}
+
+  // Hold bpm from beat onwards
+  virtual void setTempoAtBeat(double bpm, double beat) = 0;
+  // Ramp linearly (in beats) from the previous tempo point to reach bpm at beat
+  virtual void linearRampToTempoAtBeat(double bpm, double beat) = 0;
+
+  virtual double tempoAtBeat(double beat) = 0;
+  virtual double secondsForBeat(double beat) = 0;
+  virtual double beatForSeconds(double seconds) = 0;
+
+  // Incremented on every change to the tempo points
+  virtual uint64_t version() const = 0;
+  // The earliest beat whose time in seconds changed after the given version, infinity if none
+  // did, or -infinity if the version is too old for the changes since it to be known
+  virtual double earliestChangedBeatSince(uint64_t version) = 0;
+};
+
+std::shared_ptr<TempoMap> createTempoMap(double bpm);
+
+}  // namespace param
+}  // namespace nativeformat
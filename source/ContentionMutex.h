@@ -0,0 +1,83 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#pragma once
+
+#include <chrono>
+#include <cstddef>
+#include <mutex>
+
+namespace nativeformat {
+namespace param {
+
+struct LockWaitStatistics {
+  size_t locks;
+  size_t contended_locks;
+  std::chrono::nanoseconds total_wait;
+  std::chrono::nanoseconds max_wait;
+};
+
+/* A mutex that records how long lock() waited when the mutex was already
+ * held. Uncontended locks cost a single try_lock, and the statistics are
+ * updated while the mutex is held so they need no synchronisation of their own.
+ */
+class ContentionMutex {
+ public:
+  ContentionMutex() : _statistics{0, 0, std::chrono::nanoseconds(0), std::chrono::nanoseconds(0)} {}
+
+  void lock() {
+    if (_mutex.try_lock()) {
+      ++_statistics.locks;
+      return;
+    }
+    auto wait_start = std::chrono::steady_clock::now();
+    _mutex.lock();
+    auto wait = std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now() - wait_start);
+    ++_statistics.locks;
+    ++_statistics.contended_locks;
+    _statistics.total_wait += wait;
+    if (wait > _statistics.max_wait) {
+      _statistics.max_wait = wait;
+    }
+  }
+
+  bool try_lock() {
+    if (!_mutex.try_lock()) {
+      return false;
+    }
+    ++_statistics.locks;
+    return true;
+  }
+
+  void unlock() { _mutex.unlock(); }
+
+  LockWaitStatistics statistics() {
+    std::lock_guard<std::mutex> lock(_mutex);
+    return _statistics;
+  }
+
+ private:
+  std::mutex _mutex;
+  LockWaitStatistics _statistics;
+};
+
+}  // namespace param
+}  // namespace nativeformat
@@ -0,0 +1,77 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#include "CurveSimplification.h"
+
+#include <algorithm>
+#include <cmath>
+#include <utility>
+
+namespace nativeformat {
+namespace param {
+
+std::vector<size_t> simplifyCurve(const std::vector<float> &values, float tolerance) {
+  std::vector<size_t> indices;
+  if (values.size() < 3) {
+    for (size_t i = 0; i < values.size(); ++i) {
+      indices.push_back(i);
+    }
+    return indices;
+  }
+
+  // Split segments iteratively, so that long curves cannot overflow the stack
+  std::vector<bool> keep(values.size(), false);
+  keep.front() = keep.back() = true;
+  std::vector<std::pair<size_t, size_t>> segments{{0, values.size() - 1}};
+  while (!segments.empty()) {
+    size_t first = segments.back().first;
+    size_t last = segments.back().second;
+    segments.pop_back();
+    if (last - first < 2) {
+      continue;
+    }
+
+    double slope = (static_cast<double>(values[last]) - values[first]) / (last - first);
+    double max_error = 0.0;
+    size_t max_error_index = first + 1;
+    for (size_t i = first + 1; i < last; ++i) {
+      double error = std::abs(values[i] - (values[first] + slope * (i - first)));
+      if (error > max_error) {
+        max_error = error;
+        max_error_index = i;
+      }
+    }
+    if (max_error > tolerance) {
+      keep[max_error_index] = true;
+      segments.emplace_back(first, max_error_index);
+      segments.emplace_back(max_error_index, last);
+    }
+  }
+
+  for (size_t i = 0; i < keep.size(); ++i) {
+    if (keep[i]) {
+      indices.push_back(i);
+    }
+  }
+  return indices;
+}
+
+}  // namespace param
+}  // namespace nativeformat
@@ -0,0 +1,36 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#pragma once
+
+#include <cstddef>
+#include <vector>
+
+namespace nativeformat {
+namespace param {
+
+// Simplify a curve of evenly spaced values with the Ramer-Douglas-Peucker algorithm.
+// Returns the indices of the values to keep, always including the first and last value, so that
+// linear interpolation between them never differs from the linear interpolation of the full curve
+// by more than tolerance.
+std::vector<size_t> simplifyCurve(const std::vector<float> &values, float tolerance);
+
+}  // namespace param
+}  // namespace nativeformat
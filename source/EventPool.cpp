@@ -0,0 +1,72 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#include "EventPool.h"
+
+namespace nativeformat {
+namespace param {
+
+void EventDeleter::operator()(ParamEvent *event) const {
+  if (!pool) {
+    delete event;
+    return;
+  }
+  // The block starts at the most derived event, rather than at its ParamEvent
+  void *block = dynamic_cast<void *>(event);
+  event->~ParamEvent();
+  pool->release(block);
+}
+
+EventPool::EventPool() : _blocks_count(0) {}
+
+EventPool::~EventPool() {}
+
+void EventPool::reserve(size_t available_blocks) {
+  std::lock_guard<std::mutex> lock(_mutex);
+  if (_free_blocks.size() >= available_blocks) {
+    return;
+  }
+  size_t new_blocks_count = available_blocks - _free_blocks.size();
+  std::unique_ptr<Block[]> chunk(new Block[new_blocks_count]);
+  _blocks_count += new_blocks_count;
+  _free_blocks.reserve(_blocks_count);
+  for (size_t i = 0; i < new_blocks_count; ++i) {
+    _free_blocks.push_back(&chunk[i]);
+  }
+  _chunks.push_back(std::move(chunk));
+}
+
+void *EventPool::acquire() {
+  std::lock_guard<std::mutex> lock(_mutex);
+  if (_free_blocks.empty()) {
+    return nullptr;
+  }
+  void *block = _free_blocks.back();
+  _free_blocks.pop_back();
+  return block;
+}
+
+void EventPool::release(void *block) {
+  std::lock_guard<std::mutex> lock(_mutex);
+  _free_blocks.push_back(block);
+}
+
+}  // namespace param
+}  // namespace nativeformat
@@ -0,0 +1,145 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#pragma once
+
+#include <cstddef>
+#include <memory>
+#include <mutex>
+#include <new>
+#include <type_traits>
+#include <utility>
+#include <vector>
+
+#include "WAAParamEvents.h"
+
+namespace nativeformat {
+namespace param {
+
+class EventPool;
+
+template <typename EventClass>
+constexpr size_t maxEventSize() {
+  return sizeof(EventClass);
+}
+
+template <typename EventClass, typename NextEventClass, typename... EventClasses>
+constexpr size_t maxEventSize() {
+  return sizeof(EventClass) > maxEventSize<NextEventClass, EventClasses...>()
+             ? sizeof(EventClass)
+             : maxEventSize<NextEventClass, EventClasses...>();
+}
+
+template <typename EventClass>
+constexpr size_t maxEventAlignment() {
+  return alignof(EventClass);
+}
+
+template <typename EventClass, typename NextEventClass, typename... EventClasses>
+constexpr size_t maxEventAlignment() {
+  return alignof(EventClass) > maxEventAlignment<NextEventClass, EventClasses...>()
+             ? alignof(EventClass)
+             : maxEventAlignment<NextEventClass, EventClasses...>();
+}
+
+// Deletes events from the heap, or destroys them and returns their block to their pool
+struct EventDeleter {
+  std::shared_ptr<EventPool> pool;
+
+  EventDeleter() = default;
+  explicit EventDeleter(std::shared_ptr<EventPool> pool) : pool(std::move(pool)) {}
+  // Lets events created with createEvent or ParamEvent::clone be held alongside pooled events
+  template <typename EventClass>
+  EventDeleter(const std::default_delete<EventClass> &) {}
+
+  void operator()(ParamEvent *event) const;
+};
+
+typedef std::unique_ptr<ParamEvent, EventDeleter> POOLED_EVENT_PTR;
+
+/* A pool of fixed size blocks that events can be created in without
+ * allocating. Blocks are only allocated by reserve, and are only freed
+ * with the pool, which its events keep alive. Events may be deleted
+ * from any thread.
+ */
+class EventPool : public std::enable_shared_from_this<EventPool> {
+ public:
+  EventPool();
+  virtual ~EventPool();
+
+  // Allocate blocks until at least available_blocks are free
+  void reserve(size_t available_blocks);
+
+  // Create an event in a free block, or return an empty pointer if there is no free block or the
+  // event does not fit in one
+  template <typename EventClass, typename... Args>
+  POOLED_EVENT_PTR create(Args &&... args) {
+    return createInBlock<EventClass>(FitsBlock<EventClass>(), std::forward<Args>(args)...);
+  }
+
+ private:
+  friend struct EventDeleter;
+
+  // Large enough for every event that scheduling can create without allocating
+  typedef std::aligned_storage<maxEventSize<ValueAtTimeEvent,
+                                            TargetAtTimeEvent,
+                                            LinearRampEvent,
+                                            ExponentialRampEvent,
+                                            ValueCurveEvent,
+                                            OscillatorEvent>(),
+                               maxEventAlignment<ValueAtTimeEvent,
+                                                 TargetAtTimeEvent,
+                                                 LinearRampEvent,
+                                                 ExponentialRampEvent,
+                                                 ValueCurveEvent,
+                                                 OscillatorEvent>()>::type Block;
+
+  template <typename EventClass>
+  struct FitsBlock : std::integral_constant<bool,
+                                            sizeof(EventClass) <= sizeof(Block) &&
+                                                alignof(EventClass) <= alignof(Block)> {};
+
+  std::mutex _mutex;
+  std::vector<std::unique_ptr<Block[]>> _chunks;
+  // Has the capacity for every block, so that releasing a block never allocates
+  std::vector<void *> _free_blocks;
+  size_t _blocks_count;
+
+  void *acquire();
+  void release(void *block);
+
+  template <typename EventClass, typename... Args>
+  POOLED_EVENT_PTR createInBlock(std::true_type fits_block, Args &&... args) {
+    void *block = acquire();
+    if (block == nullptr) {
+      return POOLED_EVENT_PTR();
+    }
+    return POOLED_EVENT_PTR(new (block) EventClass(std::forward<Args>(args)...),
+                            EventDeleter(shared_from_this()));
+  }
+
+  template <typename EventClass, typename... Args>
+  POOLED_EVENT_PTR createInBlock(std::false_type fits_block, Args &&... args) {
+    return POOLED_EVENT_PTR();
+  }
+};
+
+}  // namespace param
+}  // namespace nativeformat
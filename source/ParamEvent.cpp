@@ -4,10 +4,24 @@ namespace nativeformat {
 namespace param {
 
 ParamEvent::ParamEvent(double start_time, double end_time, Anchor anchor)
-    : start_time(start_time), end_time(end_time), start_value(0), anchor(anchor) {}
+    : start_time(start_time),
+      end_time(end_time),
+      start_value(0),
+      start_beat(INVALID_TIME),
+      end_beat(INVALID_TIME),
+      anchor(anchor) {}
 
 ParamEvent::~ParamEvent() {}
 
+void ParamEvent::valuesAtTime(float *values,
+                              size_t values_count,
+                              double start_time,
+                              double time_step) {
+  for (size_t i = 0; i < values_count; ++i) {
+    values[i] = valueAtTime(start_time + i * time_step);
+  }
+}
+
 float ParamEvent::endValue() {
   return valueAtTime(end_time);
 }
@@ -37,6 +51,10 @@ CustomParamEvent::CustomParamEvent(double start_time,
 
 CustomParamEvent::~CustomParamEvent() {}
 
+std::unique_ptr<ParamEvent> CustomParamEvent::clone() const {
+  return std::unique_ptr<ParamEvent>(new CustomParamEvent(*this));
+}
+
 float CustomParamEvent::valueAtTime(double time) {
   return function(time);
 }
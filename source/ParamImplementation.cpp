@@ -20,31 +20,80 @@
  */
 #include "ParamImplementation.h"
 
+#include <algorithm>
+#include <atomic>
 #include <cmath>
 #include <cstring>
+#include <iterator>
+#include <limits>
 #include <sstream>
+#include <stdexcept>
+
+#include "CurveSimplification.h"
+#include "ParamKernels.h"
 
 namespace nativeformat {
 namespace param {
 
+namespace {
+
+// Guards the modulation connections of every param
+std::mutex modulation_graph_mutex;
+// Incremented whenever modulation connections are added or removed
+std::atomic<uint64_t> modulation_graph_version(0);
+
+}  // namespace
+
+template <typename EventClass, typename... Args>
+ParamImplementation::EVENT_PTR ParamImplementation::newPooledEvent(Args &&... args) {
+  if (!_event_pool) {
+    return EVENT_PTR();
+  }
+  return _event_pool->create<EventClass>(std::forward<Args>(args)...);
+}
+
+template <typename EventClass, typename... Args>
+ParamImplementation::EVENT_PTR ParamImplementation::newEvent(Args &&... args) {
+  return createEvent<EventClass>(std::forward<Args>(args)...);
+}
+
 ParamImplementation::ParamImplementation(float default_value,
                                          float max_value,
                                          float min_value,
                                          const std::string &name)
-    : _default_value(default_value), _max_value(max_value), _min_value(min_value), _name(name) {
-  _events.push_back(createEvent<DummyEvent>(default_value));
+    : _default_value(default_value),
+      _max_value(max_value),
+      _min_value(min_value),
+      _name(name),
+      _events(std::make_shared<std::list<EVENT_PTR>>()),
+      _displaced_events(std::make_shared<std::list<EVENT_PTR>>()),
+      _time_offset(0.0),
+      _automation_rate(AutomationRate::AUDIO),
+      _control_block_size(128),
+      _control_interpolation(ControlInterpolation::HOLD),
+      _timeline_version(0),
+      _tempo_map_version(0),
+      _modulation_plan_version(0) {
+  _events->push_back(newEvent<DummyEvent>(default_value));
 }
 
 ParamImplementation::~ParamImplementation() {}
 
 float ParamImplementation::valueForTime(double time) {
-  std::lock_guard<std::mutex> events_mutex(_events_mutex);
-  auto current_iterator = iteratorForTime(time);
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  double local_time = time - _time_offset;
+  auto current_iterator = iteratorForTime(local_time);
 
-  if (current_iterator == _events.end()) {
-    return defaultValue();
+  float value = (current_iterator == _events->end()) ? defaultValue()
+                                                     : (*current_iterator)->valueAtTime(local_time);
+  if (updateModulationPlan()) {
+    for (const ModulationInput &input : _modulation_inputs) {
+      value += input.depth * _modulation_plan[input.source_index].param->valueForTime(time) +
+               input.offset;
+    }
   }
-  return std::min(std::max((*current_iterator)->valueAtTime(time), minValue()), maxValue());
+  return std::min(std::max(value, minValue()), maxValue());
 }
 
 void ParamImplementation::valuesForTimeRange(float *values,
@@ -61,18 +110,97 @@ void ParamImplementation::valuesForTimeRange(float *values,
     }
     return;
   }
-  std::lock_guard<std::mutex> events_mutex(_events_mutex);
-  memset(values, 0, values_count * sizeof(float));
-  auto event_it = iteratorForTime(start_time);
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  renderEvents(values, values_count, start_time - _time_offset, end_time - _time_offset);
+  if (updateModulationPlan()) {
+    applyModulation(values, values_count, start_time, end_time);
+  }
+}
+
+void ParamImplementation::renderEvents(float *values,
+                                       size_t values_count,
+                                       double start_time,
+                                       double end_time) {
+  syncTempoMap();
+  bool use_cache = _render_cache.capacity() > 0;
+  if (use_cache &&
+      _render_cache.lookup(_timeline_version, values, values_count, start_time, end_time)) {
+    return;
+  }
   double step = (end_time - start_time) / (values_count - 1);
+  if (_automation_rate == AutomationRate::CONTROL && values_count > 1) {
+    renderControlValues(values, values_count, start_time, step);
+  } else {
+    renderValues(values, values_count, start_time, step);
+  }
+  if (use_cache) {
+    _render_cache.insert(_timeline_version, values, values_count, start_time, end_time);
+  }
+}
+
+void ParamImplementation::renderValues(float *values,
+                                       size_t values_count,
+                                       double start_time,
+                                       double step) {
+  // Values before the timeline starts, such as before a clone's time offset, are the default
+  size_t i = 0;
   double current_time = start_time;
-  for (int i = 0; i < values_count; ++i, current_time += step) {
-    if (event_it != _events.end() && current_time >= (*event_it)->end_time &&
-        (*event_it)->end_time != ParamEvent::INVALID_TIME && event_it != _events.end()) {
+  for (; i < values_count && current_time < 0.0; ++i, current_time += step) {
+    values[i] = defaultValue();
+  }
+
+  auto event_it = iteratorForTime(current_time);
+  auto event_ended = [&]() {
+    return event_it != _events->end() && current_time >= (*event_it)->end_time &&
+           (*event_it)->end_time != ParamEvent::INVALID_TIME;
+  };
+  while (i < values_count) {
+    if (event_ended()) {
       event_it++;
     }
-    values[i] =
-        (event_it == _events.end()) ? defaultValue() : (*event_it)->valueAtTime(current_time);
+
+    // Render the run of samples governed by the current event as one block
+    size_t run_start = i;
+    double run_start_time = current_time;
+    for (++i, current_time += step; i < values_count && !event_ended(); ++i, current_time += step) {
+    }
+    if (event_it == _events->end()) {
+      std::fill(values + run_start, values + i, defaultValue());
+    } else {
+      (*event_it)->valuesAtTime(values + run_start, i - run_start, run_start_time, step);
+    }
+  }
+}
+
+void ParamImplementation::renderControlValues(float *values,
+                                              size_t values_count,
+                                              double start_time,
+                                              double step) {
+  size_t block_size = _control_block_size;
+  size_t blocks_count = (values_count + block_size - 1) / block_size;
+
+  // Linear interpolation also needs the first value of the block after the range
+  size_t control_count =
+      blocks_count + (_control_interpolation == ControlInterpolation::LINEAR ? 1 : 0);
+  if (_control_values_buffer.size() < control_count) {
+    _control_values_buffer.resize(control_count);
+  }
+  float *control_values = _control_values_buffer.data();
+  renderValues(control_values, control_count, start_time, step * block_size);
+
+  for (size_t block = 0; block < blocks_count; ++block) {
+    float *block_values = values + block * block_size;
+    size_t block_count = std::min(block_size, values_count - block * block_size);
+    if (_control_interpolation == ControlInterpolation::LINEAR) {
+      kernels().linearRamp(block_values,
+                           block_count,
+                           0.0,
+                           1.0 / block_size,
+                           control_values[block],
+                           control_values[block + 1]);
+    } else {
+      std::fill(block_values, block_values + block_count, control_values[block]);
+    }
   }
 }
 
@@ -98,10 +226,14 @@ float ParamImplementation::smoothedValueForTimeRange(double start_time,
 float ParamImplementation::cumulativeValueForTimeRange(double start_time,
                                                        double end_time,
                                                        double precision) {
+  start_time -= _time_offset;
+  end_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
   auto param_iter = iteratorForTime(start_time);
   auto end_iter = iteratorForTime(end_time);
 
-  if (param_iter == _events.end()) {
+  if (param_iter == _events->end()) {
     return 0;
   }
 
@@ -124,7 +256,7 @@ float ParamImplementation::cumulativeValueForTimeRange(double start_time,
   }
 
   // now get remainder
-  if (param_iter != _events.end()) {
+  if (param_iter != _events->end()) {
     cumulative_value +=
         param_iter->get()->cumulativeValue(param_iter->get()->start_time, end_time, precision);
   }
@@ -137,6 +269,52 @@ float ParamImplementation::cumulativeValueForTimeRange(double start_time,
   return cumulative_value;
 }
 
+AutomationRate ParamImplementation::automationRate() {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  return _automation_rate;
+}
+
+void ParamImplementation::setAutomationRate(AutomationRate rate,
+                                            size_t control_block_size,
+                                            ControlInterpolation interpolation) {
+  if (control_block_size == 0) {
+    throw std::invalid_argument("Control block size must be greater than 0");
+  }
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  _automation_rate = rate;
+  _control_block_size = control_block_size;
+  _control_interpolation = interpolation;
+  ++_timeline_version;
+}
+
+void ParamImplementation::setRenderCacheCapacity(size_t max_cached_values) {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  _render_cache.setCapacity(max_cached_values);
+}
+
+RenderCacheStatistics ParamImplementation::renderCacheStatistics() {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  return _render_cache.statistics();
+}
+
+std::shared_ptr<Param> ParamImplementation::clone(double time_offset) {
+  auto param = std::make_shared<ParamImplementation>(_default_value, _max_value, _min_value, _name);
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  param->_events = _events;
+  param->_displaced_events = _displaced_events;
+  param->_time_offset = _time_offset + time_offset;
+  param->_automation_rate = _automation_rate;
+  param->_control_block_size = _control_block_size;
+  param->_control_interpolation = _control_interpolation;
+  param->_render_cache.setCapacity(_render_cache.capacity());
+  param->_tempo_map = _tempo_map;
+  param->_tempo_map_version = _tempo_map_version;
+  std::lock_guard<std::mutex> graph_mutex(modulation_graph_mutex);
+  // The clone builds its own plan on first render, as its plan version starts at 0
+  param->_modulations = _modulations;
+  return param;
+}
+
 float ParamImplementation::defaultValue() const {
   return _default_value;
 }
@@ -154,17 +332,23 @@ void ParamImplementation::setValue(float value) {
 }
 
 void ParamImplementation::setValueAtTime(float value, double time) {
-  std::lock_guard<std::mutex> events_mutex(_events_mutex);
+  time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
   auto prev_it = prevEvent(time);
-  auto event = createEvent<ValueAtTimeEvent>(value, time);
+  auto event = newEvent<ValueAtTimeEvent>(value, time);
   addEvent(std::move(event), prev_it);
 }
 
 void ParamImplementation::linearRampToValueAtTime(float end_value, double end_time) {
   {
-    std::lock_guard<std::mutex> events_mutex(_events_mutex);
-    auto prev_it = prevEvent(end_time);
-    auto event = createEvent<LinearRampEvent>(end_value, end_time);
+    std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+    syncTempoMap();
+    makeEventsUnique();
+    double local_end_time = end_time - _time_offset;
+    auto prev_it = prevEvent(local_end_time);
+    auto event = newEvent<LinearRampEvent>(end_value, local_end_time);
     addEvent(std::move(event), prev_it);
   }
 
@@ -174,9 +358,12 @@ void ParamImplementation::linearRampToValueAtTime(float end_value, double end_ti
 
 void ParamImplementation::exponentialRampToValueAtTime(float end_value, double end_time) {
   {
-    std::lock_guard<std::mutex> events_mutex(_events_mutex);
-    auto prev_it = prevEvent(end_time);
-    auto event = createEvent<ExponentialRampEvent>(end_value, end_time);
+    std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+    syncTempoMap();
+    makeEventsUnique();
+    double local_end_time = end_time - _time_offset;
+    auto prev_it = prevEvent(local_end_time);
+    auto event = newEvent<ExponentialRampEvent>(end_value, local_end_time);
     addEvent(std::move(event), prev_it);
   }
 
@@ -185,10 +372,13 @@ void ParamImplementation::exponentialRampToValueAtTime(float end_value, double e
 }
 
 void ParamImplementation::setTargetAtTime(float target, double start_time, float time_constant) {
-  std::lock_guard<std::mutex> events_mutex(_events_mutex);
+  start_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
   auto prev_it = prevEvent(start_time);
-  auto event = createEvent<TargetAtTimeEvent>(target, start_time, time_constant);
-  if (prev_it != _events.end()) {
+  auto event = newEvent<TargetAtTimeEvent>(target, start_time, time_constant);
+  if (prev_it != _events->end()) {
     event->start_value = (*prev_it)->endValue();
   }
   addEvent(std::move(event), prev_it);
@@ -197,40 +387,429 @@ void ParamImplementation::setTargetAtTime(float target, double start_time, float
 void ParamImplementation::setValueCurveAtTime(std::vector<float> values,
                                               double start_time,
                                               double duration) {
-  std::lock_guard<std::mutex> events_mutex(_events_mutex);
+  start_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
+  auto prev_it = prevEvent(start_time);
+  auto event = newEvent<ValueCurveEvent>(
+      std::make_shared<const std::vector<float>>(std::move(values)), start_time, duration);
+  addEvent(std::move(event), prev_it);
+}
+
+void ParamImplementation::setValueCurveAtTime(NF_AUDIO_PARAM_CURVE values,
+                                              double start_time,
+                                              double duration) {
+  if (!values || values->size() < 2) {
+    throw std::invalid_argument("A value curve needs at least 2 values");
+  }
+  start_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
   auto prev_it = prevEvent(start_time);
-  auto event = createEvent<ValueCurveEvent>(values, start_time, duration);
+  auto event = newEvent<ValueCurveEvent>(std::move(values), start_time, duration);
   addEvent(std::move(event), prev_it);
 }
 
+size_t ParamImplementation::setSimplifiedValueCurveAtTime(std::vector<float> values,
+                                                          double start_time,
+                                                          double duration,
+                                                          float tolerance) {
+  if (values.size() < 2) {
+    throw std::invalid_argument("A value curve needs at least 2 values");
+  }
+  if (!std::isfinite(tolerance) || tolerance < 0.0f) {
+    throw std::invalid_argument("A curve's tolerance must be finite and not negative");
+  }
+  start_time -= _time_offset;
+  std::vector<size_t> indices = simplifyCurve(values, tolerance);
+  std::vector<double> segment_times(indices.size());
+  std::vector<float> segment_values(indices.size());
+  double time_step = duration / (values.size() - 1);
+  for (size_t i = 0; i < indices.size(); ++i) {
+    segment_times[i] = start_time + indices[i] * time_step;
+    segment_values[i] = values[indices[i]];
+  }
+  segment_times.back() = start_time + duration;
+
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
+  auto prev_it = prevEvent(start_time);
+  auto event = newEvent<SegmentCurveEvent>(segment_times, segment_values);
+  addEvent(std::move(event), prev_it);
+  return values.size() - indices.size();
+}
+
+void ParamImplementation::cancelScheduledValues(double cancel_time) {
+  cancel_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
+  eraseEvents(nextEvent(cancel_time));
+  releaseEvents(
+      *_displaced_events, cancelledDisplacedEvents(cancel_time, false), _displaced_events->end());
+  invalidateCachedCumulativeValuesAfterTime(cancel_time);
+}
+
+void ParamImplementation::cancelAndHoldAtTime(double cancel_time) {
+  cancelAndHold(cancel_time, false);
+}
+
+ScheduleResult ParamImplementation::cancelAndHold(double cancel_time, bool pooled_only) {
+  cancel_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  if (pooled_only) {
+    ScheduleResult result = checkRealTimeScheduling();
+    if (result != ScheduleResult::SCHEDULED) {
+      return result;
+    }
+  } else {
+    syncTempoMap();
+    makeEventsUnique();
+  }
+  auto current_it = iteratorForTime(cancel_time);
+  float held_value =
+      (current_it == _events->end()) ? defaultValue() : (*current_it)->valueAtTime(cancel_time);
+
+  // Create every event before changing anything, so that running out of capacity changes nothing
+  bool cut_short = current_it != _events->end() &&
+                   ((*current_it)->anchor & Anchor::END) == Anchor::END &&
+                   (*current_it)->start_time < cancel_time && (*current_it)->end_time > cancel_time;
+  EVENT_PTR truncated;
+  bool needs_truncated = false;
+  if (cut_short && dynamic_cast<LinearRampEvent *>(current_it->get())) {
+    needs_truncated = true;
+    truncated = pooled_only ? newPooledEvent<LinearRampEvent>(held_value, cancel_time)
+                            : newEvent<LinearRampEvent>(held_value, cancel_time);
+  } else if (cut_short && dynamic_cast<ExponentialRampEvent *>(current_it->get())) {
+    needs_truncated = true;
+    truncated = pooled_only ? newPooledEvent<ExponentialRampEvent>(held_value, cancel_time)
+                            : newEvent<ExponentialRampEvent>(held_value, cancel_time);
+  }
+  EVENT_PTR held = pooled_only ? newPooledEvent<ValueAtTimeEvent>(held_value, cancel_time)
+                               : newEvent<ValueAtTimeEvent>(held_value, cancel_time);
+  // The event in progress is cut short at cancel_time rather than removed
+  auto first_erased = cut_short ? std::next(current_it) : nextEvent(cancel_time);
+  auto first_displaced_erased = cancelledDisplacedEvents(cancel_time, true);
+  if (pooled_only &&
+      (!held || (needs_truncated && !truncated) || _spare_events.empty() ||
+       !releasesWithoutFreeing(first_erased, _events->end()) ||
+       !releasesWithoutFreeing(first_displaced_erased, _displaced_events->end()) ||
+       (needs_truncated && !releasesWithoutFreeing(current_it, std::next(current_it))))) {
+    return ScheduleResult::OUT_OF_CAPACITY;
+  }
+
+  if (cut_short) {
+    EVENT_PTR &current = *current_it;
+    if (truncated) {
+      truncated->start_time = current->start_time;
+      truncated->start_value = current->start_value;
+      current = std::move(truncated);
+    } else {
+      current->end_time = cancel_time;
+    }
+    // The cut short event stays where it is in seconds, like the cancel time
+    current->start_beat = ParamEvent::INVALID_TIME;
+    current->end_beat = ParamEvent::INVALID_TIME;
+  }
+  eraseEvents(first_erased);
+  releaseEvents(*_displaced_events, first_displaced_erased, _displaced_events->end());
+  invalidateCachedCumulativeValuesAfterTime(cancel_time);
+
+  // Every anchor from cancel_time on was erased, so the held value cannot overlap
+  insertEvent(std::move(held), prevEvent(cancel_time), pooled_only);
+  return ScheduleResult::SCHEDULED;
+}
+
+void ParamImplementation::setTempoMap(std::shared_ptr<TempoMap> tempo_map) {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  _tempo_map = std::move(tempo_map);
+  if (_tempo_map) {
+    _tempo_map_version = _tempo_map->version();
+    remapEvents(-std::numeric_limits<double>::infinity());
+  }
+}
+
+std::shared_ptr<TempoMap> ParamImplementation::tempoMap() {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  return _tempo_map;
+}
+
+void ParamImplementation::setValueAtBeat(float value, double beat) {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
+  double time = secondsForBeat(beat);
+  auto prev_it = prevEvent(time);
+  auto event = newEvent<ValueAtTimeEvent>(value, time);
+  event->start_beat = beat;
+  addEvent(std::move(event), prev_it);
+}
+
+void ParamImplementation::linearRampToValueAtBeat(float end_value, double end_beat) {
+  {
+    std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+    syncTempoMap();
+    makeEventsUnique();
+    double end_time = secondsForBeat(end_beat);
+    auto prev_it = prevEvent(end_time);
+    auto event = newEvent<LinearRampEvent>(end_value, end_time);
+    event->end_beat = end_beat;
+    addEvent(std::move(event), prev_it);
+  }
+
+  // implicit setValueAtBeat to maintain the end_value
+  setValueAtBeat(end_value, end_beat);
+}
+
+void ParamImplementation::setTargetAtBeat(float target, double start_beat, float time_constant) {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
+  double start_time = secondsForBeat(start_beat);
+  auto prev_it = prevEvent(start_time);
+  auto event = newEvent<TargetAtTimeEvent>(target, start_time, time_constant);
+  event->start_beat = start_beat;
+  if (prev_it != _events->end()) {
+    event->start_value = (*prev_it)->endValue();
+  }
+  addEvent(std::move(event), prev_it);
+}
+
+void ParamImplementation::exponentialRampToValueAtBeat(float end_value, double end_beat) {
+  {
+    std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+    syncTempoMap();
+    makeEventsUnique();
+    double end_time = secondsForBeat(end_beat);
+    auto prev_it = prevEvent(end_time);
+    auto event = newEvent<ExponentialRampEvent>(end_value, end_time);
+    event->end_beat = end_beat;
+    addEvent(std::move(event), prev_it);
+  }
+
+  // implicit setValueAtBeat to maintain the end_value
+  setValueAtBeat(end_value, end_beat);
+}
+
+void ParamImplementation::setValueCurveAtBeat(NF_AUDIO_PARAM_CURVE values,
+                                              double start_beat,
+                                              double duration_beats) {
+  if (!values || values->size() < 2) {
+    throw std::invalid_argument("A value curve needs at least 2 values");
+  }
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
+  double start_time = secondsForBeat(start_beat);
+  double end_time = secondsForBeat(start_beat + duration_beats);
+  auto prev_it = prevEvent(start_time);
+  auto event = newEvent<ValueCurveEvent>(std::move(values), start_time, end_time - start_time);
+  event->start_beat = start_beat;
+  event->end_beat = start_beat + duration_beats;
+  addEvent(std::move(event), prev_it);
+}
+
+float ParamImplementation::valueForBeat(double beat) {
+  double time;
+  {
+    std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+    time = secondsForBeat(beat) + _time_offset;
+  }
+  return valueForTime(time);
+}
+
+void ParamImplementation::valuesForBeatRange(float *values,
+                                             size_t values_count,
+                                             double start_beat,
+                                             double end_beat) {
+  double start_time, end_time;
+  {
+    std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+    start_time = secondsForBeat(start_beat) + _time_offset;
+    end_time = secondsForBeat(end_beat) + _time_offset;
+  }
+  valuesForTimeRange(values, values_count, start_time, end_time);
+}
+
 void ParamImplementation::addCustomEvent(double start_time,
                                          double end_time,
                                          Anchor anchor,
                                          NF_AUDIO_PARAM_FUNCTION function) {
-  std::lock_guard<std::mutex> events_mutex(_events_mutex);
+  if (_time_offset != 0.0) {
+    // The function is called with the time it was scheduled in
+    double time_offset = _time_offset;
+    function = [function, time_offset](double time) { return function(time + time_offset); };
+    start_time -= time_offset;
+    if (end_time != ParamEvent::INVALID_TIME) {
+      end_time -= time_offset;
+    }
+  }
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
+  auto prev_it = prevEvent(start_time);
+  auto event = newEvent<CustomParamEvent>(start_time, end_time, anchor, function);
+  addEvent(std::move(event), prev_it);
+}
+
+void ParamImplementation::setOscillatorAtTime(Waveform waveform,
+                                              float frequency,
+                                              double start_time) {
+  start_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  syncTempoMap();
+  makeEventsUnique();
   auto prev_it = prevEvent(start_time);
-  auto event = createEvent<CustomParamEvent>(start_time, end_time, anchor, function);
+  auto event = newEvent<OscillatorEvent>(waveform, frequency, start_time);
   addEvent(std::move(event), prev_it);
 }
 
-std::list<std::unique_ptr<ParamEvent>>::iterator ParamImplementation::iteratorForTime(double time) {
+void ParamImplementation::connectModulation(std::shared_ptr<Param> source,
+                                            float depth,
+                                            float offset) {
+  auto source_implementation = std::dynamic_pointer_cast<ParamImplementation>(source);
+  if (!source_implementation) {
+    throw std::invalid_argument("Modulation sources must be created by createParam or createLFO");
+  }
+  std::lock_guard<std::mutex> graph_mutex(modulation_graph_mutex);
+  if (source_implementation->isModulatedBy(this)) {
+    throw std::invalid_argument("Modulating " + _name + " by " + source_implementation->_name +
+                                " would form a cycle");
+  }
+  _modulations.push_back({std::move(source_implementation), depth, offset});
+  ++modulation_graph_version;
+}
+
+void ParamImplementation::disconnectModulation(std::shared_ptr<Param> source) {
+  std::lock_guard<std::mutex> graph_mutex(modulation_graph_mutex);
+  auto removed_it = std::remove_if(
+      _modulations.begin(), _modulations.end(), [&](const ModulationConnection &connection) {
+        return connection.source == source;
+      });
+  if (removed_it != _modulations.end()) {
+    _modulations.erase(removed_it, _modulations.end());
+    ++modulation_graph_version;
+  }
+}
+
+void ParamImplementation::reserveEvents(size_t capacity) {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  makeEventsUnique();
+  if (!_event_pool) {
+    _event_pool = std::make_shared<EventPool>();
+  }
+  _event_pool->reserve(capacity);
+  while (_spare_events.size() < capacity) {
+    _spare_events.emplace_back();
+  }
+}
+
+ScheduleResult ParamImplementation::trySetValueAtTime(float value, double time) {
+  time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  ScheduleResult result = checkRealTimeScheduling();
+  if (result != ScheduleResult::SCHEDULED) {
+    return result;
+  }
+  EVENT_PTR event = newPooledEvent<ValueAtTimeEvent>(value, time);
+  return tryAddEvents(&event, 1);
+}
+
+ScheduleResult ParamImplementation::tryLinearRampToValueAtTime(float end_value, double end_time) {
+  end_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  ScheduleResult result = checkRealTimeScheduling();
+  if (result != ScheduleResult::SCHEDULED) {
+    return result;
+  }
+  // The ramp and the implicit setValueAtTime to maintain the end_value
+  EVENT_PTR events[] = {newPooledEvent<LinearRampEvent>(end_value, end_time),
+                        newPooledEvent<ValueAtTimeEvent>(end_value, end_time)};
+  return tryAddEvents(events, 2);
+}
+
+ScheduleResult ParamImplementation::trySetTargetAtTime(float target,
+                                                       double start_time,
+                                                       float time_constant) {
+  start_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  ScheduleResult result = checkRealTimeScheduling();
+  if (result != ScheduleResult::SCHEDULED) {
+    return result;
+  }
+  EVENT_PTR event = newPooledEvent<TargetAtTimeEvent>(target, start_time, time_constant);
+  auto prev_it = prevEvent(start_time);
+  if (event && prev_it != _events->end()) {
+    event->start_value = (*prev_it)->endValue();
+  }
+  return tryAddEvents(&event, 1);
+}
+
+ScheduleResult ParamImplementation::tryExponentialRampToValueAtTime(float end_value,
+                                                                    double end_time) {
+  end_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  ScheduleResult result = checkRealTimeScheduling();
+  if (result != ScheduleResult::SCHEDULED) {
+    return result;
+  }
+  // The ramp and the implicit setValueAtTime to maintain the end_value
+  EVENT_PTR events[] = {newPooledEvent<ExponentialRampEvent>(end_value, end_time),
+                        newPooledEvent<ValueAtTimeEvent>(end_value, end_time)};
+  return tryAddEvents(events, 2);
+}
+
+ScheduleResult ParamImplementation::trySetValueCurveAtTime(NF_AUDIO_PARAM_CURVE values,
+                                                           double start_time,
+                                                           double duration) {
+  if (!values || values->size() < 2) {
+    return ScheduleResult::INVALID_ARGUMENT;
+  }
+  start_time -= _time_offset;
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  ScheduleResult result = checkRealTimeScheduling();
+  if (result != ScheduleResult::SCHEDULED) {
+    return result;
+  }
+  EVENT_PTR event = newPooledEvent<ValueCurveEvent>(std::move(values), start_time, duration);
+  return tryAddEvents(&event, 1);
+}
+
+ScheduleResult ParamImplementation::tryCancelAndHoldAtTime(double cancel_time) {
+  return cancelAndHold(cancel_time, true);
+}
+
+LockWaitStatistics ParamImplementation::eventsMutexStatistics() {
+  return _events_mutex.statistics();
+}
+
+size_t ParamImplementation::eventsCount() {
+  std::lock_guard<ContentionMutex> events_mutex(_events_mutex);
+  return _events->size();
+}
+
+std::list<ParamImplementation::EVENT_PTR>::iterator
+ParamImplementation::iteratorForTime(double time) {
   if (time < 0.0) {
-    return _events.end();
+    return _events->end();
   }
-  for (auto it = _events.begin(); it != _events.end(); it++) {
+  for (auto it = _events->begin(); it != _events->end(); it++) {
     EVENT_PTR &event = *it;
     if ((event->end_time > time || event->end_time == ParamEvent::INVALID_TIME) &&
         event->start_time <= time) {
       return it;
     }
   }
-  return _events.end();
+  return _events->end();
 }
 
-std::list<std::unique_ptr<ParamEvent>>::iterator ParamImplementation::prevEvent(double time) {
-  auto prev_it = _events.end();
+std::list<ParamImplementation::EVENT_PTR>::iterator ParamImplementation::prevEvent(double time) {
+  auto prev_it = _events->end();
   double prev_time = 0.0;
-  for (auto it = _events.begin(); it != _events.end(); it++) {
+  for (auto it = _events->begin(); it != _events->end(); it++) {
     double t = ((*it)->anchor & Anchor::END) == Anchor::END ? (*it)->end_time : (*it)->start_time;
     if (t >= prev_time && t <= time) {
       prev_time = t;
@@ -240,6 +819,73 @@ std::list<std::unique_ptr<ParamEvent>>::iterator ParamImplementation::prevEvent(
   return prev_it;
 }
 
+std::list<ParamImplementation::EVENT_PTR>::iterator ParamImplementation::nextEvent(double time) {
+  for (auto it = _events->begin(); it != _events->end(); it++) {
+    if ((*it)->anchor == Anchor::NONE) {
+      continue;
+    }
+    double t =
+        ((*it)->anchor & Anchor::START) == Anchor::START ? (*it)->start_time : (*it)->end_time;
+    if (t >= time) {
+      return it;
+    }
+  }
+  return _events->end();
+}
+
+void ParamImplementation::makeEventsUnique() {
+  if (_events.use_count() == 1) {
+    return;
+  }
+  auto events = std::make_shared<std::list<EVENT_PTR>>();
+  for (const auto &event : *_events) {
+    events->push_back(event->clone());
+  }
+  _events = std::move(events);
+  auto displaced_events = std::make_shared<std::list<EVENT_PTR>>();
+  for (const auto &event : *_displaced_events) {
+    displaced_events->push_back(event->clone());
+  }
+  _displaced_events = std::move(displaced_events);
+}
+
+void ParamImplementation::eraseEvents(std::list<EVENT_PTR>::iterator first) {
+  if (first == _events->end()) {
+    return;
+  }
+  releaseEvents(*_events, first, _events->end());
+  ++_timeline_version;
+  if (!_events->empty() && (_events->back()->anchor & Anchor::END) == Anchor::NONE) {
+    _events->back()->end_time = ParamEvent::INVALID_TIME;
+  }
+}
+
+void ParamImplementation::releaseEvents(std::list<EVENT_PTR> &events,
+                                        std::list<EVENT_PTR>::iterator first,
+                                        std::list<EVENT_PTR>::iterator last) {
+  if (_event_pool) {
+    // Keep the list nodes for later events rather than freeing them
+    for (auto it = first; it != last; ++it) {
+      it->reset();
+    }
+    _spare_events.splice(_spare_events.end(), events, first, last);
+  } else {
+    events.erase(first, last);
+  }
+}
+
+std::list<ParamImplementation::EVENT_PTR>::iterator
+ParamImplementation::cancelledDisplacedEvents(double cancel_time, bool hold) {
+  return std::partition(
+      _displaced_events->begin(), _displaced_events->end(), [&](const EVENT_PTR &event) {
+        double start, end;
+        getRequiredTimeRange(event, start, end);
+        double event_time =
+            ((event->anchor & Anchor::START) == Anchor::START) ? event->start_time : end;
+        return event_time < cancel_time && (!hold || end < cancel_time);
+      });
+}
+
 bool ParamImplementation::getRequiredTimeRange(const EVENT_PTR &event, double &start, double &end) {
   if (event->anchor == Anchor::NONE) {
     return false;
@@ -249,21 +895,30 @@ bool ParamImplementation::getRequiredTimeRange(const EVENT_PTR &event, double &s
   return true;
 }
 
-void ParamImplementation::checkOverlap(const EVENT_PTR &event) {
-  double s1, e1, s2, e2;
+bool ParamImplementation::findOverlap(const EVENT_PTR &event, double &start, double &end) {
+  double s1, e1;
   if (!getRequiredTimeRange(event, s1, e1)) {
-    return;
+    return false;
   }
-  for (const auto &e : _events) {
-    if (getRequiredTimeRange(e, s2, e2)) {
-      if (s1 < e2 && s2 < e1) {
-        std::stringstream msg;
-        msg << "New event with required time range " << s1 << " - " << e1
-            << " conflicts with existing event with required time range " << s2 << " - " << e2;
-        throw std::invalid_argument(msg.str());
+  for (const auto &e : *_events) {
+    if (getRequiredTimeRange(e, start, end)) {
+      if (s1 < end && start < e1) {
+        return true;
       }
     }
   }
+  return false;
+}
+
+void ParamImplementation::checkOverlap(const EVENT_PTR &event) {
+  double s1, e1, s2, e2;
+  if (findOverlap(event, s2, e2)) {
+    getRequiredTimeRange(event, s1, e1);
+    std::stringstream msg;
+    msg << "New event with required time range " << s1 << " - " << e1
+        << " conflicts with existing event with required time range " << s2 << " - " << e2;
+    throw std::invalid_argument(msg.str());
+  }
 }
 
 void ParamImplementation::updateTimes(EVENT_PTR &prev, EVENT_PTR &event) {
@@ -291,17 +946,269 @@ void ParamImplementation::updateTimes(EVENT_PTR &prev, EVENT_PTR &event) {
 
 void ParamImplementation::addEvent(EVENT_PTR new_event, std::list<EVENT_PTR>::iterator prev_event) {
   checkOverlap(new_event);
+  insertEvent(std::move(new_event), prev_event);
+}
 
+void ParamImplementation::insertEvent(EVENT_PTR new_event,
+                                      std::list<EVENT_PTR>::iterator prev_event,
+                                      bool pooled_only) {
   auto next_event = prev_event;
-  if (prev_event != _events.end()) {
+  if (prev_event != _events->end()) {
     updateTimes(*prev_event, new_event);
     ++next_event;
-    if (next_event != _events.end()) {
+    if (next_event != _events->end()) {
       updateTimes(new_event, *next_event);
     }
   }
   invalidateCachedCumulativeValuesAfterTime(new_event->start_time);
-  _events.insert(next_event, std::move(new_event));
+  if (pooled_only) {
+    _spare_events.front() = std::move(new_event);
+    _events->splice(next_event, _spare_events, _spare_events.begin());
+  } else {
+    _events->insert(next_event, std::move(new_event));
+  }
+  ++_timeline_version;
+}
+
+ScheduleResult ParamImplementation::checkRealTimeScheduling() {
+  // Copying shared events or remapping them to a changed tempo map may allocate
+  if (_events.use_count() != 1) {
+    return ScheduleResult::OUT_OF_CAPACITY;
+  }
+  if (_tempo_map && _tempo_map->version() != _tempo_map_version) {
+    return ScheduleResult::TEMPO_MAP_CHANGED;
+  }
+  return ScheduleResult::SCHEDULED;
+}
+
+bool ParamImplementation::releasesWithoutFreeing(std::list<EVENT_PTR>::iterator first,
+                                                 std::list<EVENT_PTR>::iterator last) {
+  for (auto it = first; it != last; ++it) {
+    if (!it->get_deleter().pool) {
+      return false;
+    }
+    // The last reference to a shared curve would free it
+    auto curve_event = dynamic_cast<ValueCurveEvent *>(it->get());
+    if (curve_event && curve_event->values.use_count() == 1) {
+      return false;
+    }
+  }
+  return true;
+}
+
+ScheduleResult ParamImplementation::tryAddEvents(EVENT_PTR *events, size_t events_count) {
+  if (_spare_events.size() < events_count) {
+    return ScheduleResult::OUT_OF_CAPACITY;
+  }
+  double start, end;
+  for (size_t i = 0; i < events_count; ++i) {
+    if (!events[i]) {
+      return ScheduleResult::OUT_OF_CAPACITY;
+    }
+    if (findOverlap(events[i], start, end)) {
+      return ScheduleResult::CONFLICT;
+    }
+  }
+  for (size_t i = 0; i < events_count; ++i) {
+    EVENT_PTR &event = events[i];
+    double anchor_time =
+        ((event->anchor & Anchor::START) == Anchor::START) ? event->start_time : event->end_time;
+    insertEvent(std::move(event), prevEvent(anchor_time), true);
+  }
+  return ScheduleResult::SCHEDULED;
+}
+
+double ParamImplementation::secondsForBeat(double beat) {
+  if (!_tempo_map) {
+    throw std::logic_error("Param " + _name + " has no tempo map to schedule beats with");
+  }
+  return _tempo_map->secondsForBeat(beat);
+}
+
+void ParamImplementation::syncTempoMap() {
+  if (!_tempo_map) {
+    return;
+  }
+  uint64_t version = _tempo_map->version();
+  if (version == _tempo_map_version) {
+    return;
+  }
+  double changed_beat = _tempo_map->earliestChangedBeatSince(_tempo_map_version);
+  _tempo_map_version = version;
+  remapEvents(changed_beat);
+}
+
+void ParamImplementation::remapEvents(double changed_beat) {
+  makeEventsUnique();
+  bool any_moved = false;
+  double earliest_time = std::numeric_limits<double>::infinity();
+  auto remap = [&](EVENT_PTR &event) {
+    bool start_moved =
+        event->start_beat != ParamEvent::INVALID_TIME && event->start_beat >= changed_beat;
+    bool end_moved = event->end_beat != ParamEvent::INVALID_TIME && event->end_beat >= changed_beat;
+    if (!start_moved && !end_moved) {
+      return;
+    }
+    double old_start_time = event->start_time;
+    double old_duration = event->end_time - event->start_time;
+    if (start_moved) {
+      event->start_time = _tempo_map->secondsForBeat(event->start_beat);
+    }
+    if (end_moved) {
+      event->end_time = _tempo_map->secondsForBeat(event->end_beat);
+    }
+    if (auto curve = dynamic_cast<ValueCurveEvent *>(event.get())) {
+      // Stretch the curve with its anchors, including when it was cut short
+      if (old_duration > 0.0) {
+        curve->duration *= (curve->end_time - curve->start_time) / old_duration;
+      }
+    }
+    any_moved = true;
+    earliest_time = std::min(earliest_time, std::min(old_start_time, event->start_time));
+  };
+  for (EVENT_PTR &event : *_events) {
+    remap(event);
+  }
+  for (EVENT_PTR &event : *_displaced_events) {
+    remap(event);
+  }
+  if (!any_moved) {
+    return;
+  }
+
+  // The tempo change may have made room for the displaced events, so place them again
+  double start, end;
+  for (const EVENT_PTR &event : *_displaced_events) {
+    getRequiredTimeRange(event, start, end);
+    earliest_time = std::min(earliest_time, start);
+  }
+  _events->splice(_events->end(), *_displaced_events);
+
+  // Moved events can pass events scheduled in seconds, so restore the order of their required
+  // time ranges
+  auto required_start_time = [](const EVENT_PTR &event) {
+    return (event->anchor == Anchor::END) ? event->end_time : event->start_time;
+  };
+  auto required_start_less = [&](const EVENT_PTR &a, const EVENT_PTR &b) {
+    return required_start_time(a) < required_start_time(b);
+  };
+  if (!std::is_sorted(_events->begin(), _events->end(), required_start_less)) {
+    _events->sort(required_start_less);
+  }
+
+  // Where events now overlap, the one whose required time range starts first wins. Remapping
+  // cannot throw, so the others are displaced rather than removed, until a tempo change makes
+  // room for them again. Comparing with the kept range that ends last finds every overlap, as
+  // the ranges are in order of their starts.
+  double kept_start = 0.0;
+  double kept_end = -std::numeric_limits<double>::infinity();
+  for (auto it = _events->begin(); it != _events->end();) {
+    auto next_it = std::next(it);
+    if (getRequiredTimeRange(*it, start, end)) {
+      if (start < kept_end && kept_start < end) {
+        earliest_time = std::min(earliest_time, start);
+        _displaced_events->splice(_displaced_events->end(), *_events, it);
+      } else if (end > kept_end) {
+        kept_start = start;
+        kept_end = end;
+      }
+    }
+    it = next_it;
+  }
+
+  // Times that were derived from a neighbour's anchor follow the remapped anchors
+  for (auto prev_it = _events->begin(), next_it = std::next(prev_it); next_it != _events->end();
+       ++prev_it, ++next_it) {
+    updateTimes(*prev_it, *next_it);
+  }
+  if ((_events->back()->anchor & Anchor::END) == Anchor::NONE) {
+    _events->back()->end_time = ParamEvent::INVALID_TIME;
+  }
+  invalidateCachedCumulativeValuesAfterTime(earliest_time);
+  ++_timeline_version;
+}
+
+bool ParamImplementation::updateModulationPlan() {
+  if (modulation_graph_version.load() == _modulation_plan_version) {
+    return !_modulation_inputs.empty();
+  }
+  std::lock_guard<std::mutex> graph_mutex(modulation_graph_mutex);
+  _modulation_plan_version = modulation_graph_version.load();
+  _modulation_plan.clear();
+  _modulation_inputs.clear();
+  std::map<const ParamImplementation *, size_t> node_indices;
+  for (const ModulationConnection &connection : _modulations) {
+    _modulation_inputs.push_back(
+        {addModulationNode(connection.source, node_indices), connection.depth, connection.offset});
+  }
+  _modulation_buffers.resize(_modulation_plan.size());
+  return !_modulation_inputs.empty();
+}
+
+size_t ParamImplementation::addModulationNode(
+    const std::shared_ptr<ParamImplementation> &param,
+    std::map<const ParamImplementation *, size_t> &node_indices) {
+  auto index_it = node_indices.find(param.get());
+  if (index_it != node_indices.end()) {
+    return index_it->second;
+  }
+  ModulationNode node{param, {}};
+  for (const ModulationConnection &connection : param->_modulations) {
+    node.inputs.push_back(
+        {addModulationNode(connection.source, node_indices), connection.depth, connection.offset});
+  }
+  // A node follows every node it depends on, so each is rendered once and in order
+  size_t index = _modulation_plan.size();
+  node_indices[param.get()] = index;
+  _modulation_plan.push_back(std::move(node));
+  return index;
+}
+
+void ParamImplementation::applyModulation(float *values,
+                                          size_t values_count,
+                                          double start_time,
+                                          double end_time) {
+  auto modulate = [&](const ParamImplementation &param,
+                      float *param_values,
+                      const std::vector<ModulationInput> &inputs) {
+    for (const ModulationInput &input : inputs) {
+      const float *source_values = _modulation_buffers[input.source_index].data();
+      for (size_t i = 0; i < values_count; ++i) {
+        param_values[i] += input.depth * source_values[i] + input.offset;
+      }
+    }
+    for (size_t i = 0; i < values_count; ++i) {
+      param_values[i] = std::min(std::max(param_values[i], param.minValue()), param.maxValue());
+    }
+  };
+
+  for (size_t i = 0; i < _modulation_plan.size(); ++i) {
+    ModulationNode &node = _modulation_plan[i];
+    std::vector<float> &buffer = _modulation_buffers[i];
+    if (buffer.size() < values_count) {
+      buffer.resize(values_count);
+    }
+    {
+      std::lock_guard<ContentionMutex> events_mutex(node.param->_events_mutex);
+      double time_offset = node.param->_time_offset;
+      node.param->renderEvents(
+          buffer.data(), values_count, start_time - time_offset, end_time - time_offset);
+    }
+    modulate(*node.param, buffer.data(), node.inputs);
+  }
+  modulate(*this, values, _modulation_inputs);
+}
+
+bool ParamImplementation::isModulatedBy(const ParamImplementation *param) const {
+  if (param == this) {
+    return true;
+  }
+  for (const ModulationConnection &connection : _modulations) {
+    if (connection.source->isModulatedBy(param)) {
+      return true;
+    }
+  }
+  return false;
 }
 
 void ParamImplementation::invalidateCachedCumulativeValuesAfterTime(double time) {
@@ -322,5 +1229,11 @@ std::shared_ptr<Param> createParam(float default_value,
   return std::make_shared<ParamImplementation>(default_value, max_value, min_value, name);
 }
 
+std::shared_ptr<Param> createLFO(Waveform waveform, float frequency, const std::string &name) {
+  auto lfo = createParam(0.0f, 1.0f, -1.0f, name);
+  lfo->setOscillatorAtTime(waveform, frequency, 0.0);
+  return lfo;
+}
+
 }  // namespace param
 }  // namespace nativeformat
@@ -20,19 +20,23 @@
  */
 #pragma once
 
+#include <cstdint>
 #include <list>
 #include <map>
 #include <mutex>
 #include <string>
 
 #include <NFParam/Param.h>
+#include "ContentionMutex.h"
+#include "EventPool.h"
+#include "RenderCache.h"
 #include "WAAParamEvents.h"
 
 namespace nativeformat {
 namespace param {
 
 class ParamImplementation : public Param {
-  typedef std::unique_ptr<ParamEvent> EVENT_PTR;
+  typedef POOLED_EVENT_PTR EVENT_PTR;
 
  public:
   ParamImplementation(float default_value,
@@ -52,6 +56,13 @@ class ParamImplementation : public Param {
   float cumulativeValueForTimeRange(double start_time,
                                     double end_time,
                                     double precision = 0.1) override;
+  AutomationRate automationRate() override;
+  void setAutomationRate(AutomationRate rate,
+                         size_t control_block_size = 128,
+                         ControlInterpolation interpolation = ControlInterpolation::HOLD) override;
+  void setRenderCacheCapacity(size_t max_cached_values) override;
+  RenderCacheStatistics renderCacheStatistics() override;
+  std::shared_ptr<Param> clone(double time_offset = 0.0) override;
 
   // WAAParam
   float defaultValue() const override;
@@ -63,28 +74,144 @@ class ParamImplementation : public Param {
   void setTargetAtTime(float target, double start_time, float time_constant) override;
   void exponentialRampToValueAtTime(float value, double end_time) override;
   void setValueCurveAtTime(std::vector<float> values, double start_time, double duration) override;
+  void setValueCurveAtTime(NF_AUDIO_PARAM_CURVE values,
+                           double start_time,
+                           double duration) override;
+  size_t setSimplifiedValueCurveAtTime(std::vector<float> values,
+                                       double start_time,
+                                       double duration,
+                                       float tolerance) override;
+  void cancelScheduledValues(double cancel_time) override;
+  void cancelAndHoldAtTime(double cancel_time) override;
+
+  // Tempo map
+  void setTempoMap(std::shared_ptr<TempoMap> tempo_map) override;
+  std::shared_ptr<TempoMap> tempoMap() override;
+  void setValueAtBeat(float value, double beat) override;
+  void linearRampToValueAtBeat(float end_value, double end_beat) override;
+  void setTargetAtBeat(float target, double start_beat, float time_constant) override;
+  void exponentialRampToValueAtBeat(float value, double end_beat) override;
+  void setValueCurveAtBeat(NF_AUDIO_PARAM_CURVE values,
+                           double start_beat,
+                           double duration_beats) override;
+  float valueForBeat(double beat) override;
+  void valuesForBeatRange(float *values,
+                          size_t values_count,
+                          double start_beat,
+                          double end_beat) override;
 
   // Custom
   virtual void addCustomEvent(double start_time,
                               double end_time,
                               Anchor anchor,
                               NF_AUDIO_PARAM_FUNCTION function) override;
+  void setOscillatorAtTime(Waveform waveform, float frequency, double start_time) override;
+
+  // Modulation
+  void connectModulation(std::shared_ptr<Param> source, float depth, float offset = 0.0f) override;
+  void disconnectModulation(std::shared_ptr<Param> source) override;
+
+  // Real-time scheduling
+  void reserveEvents(size_t capacity) override;
+  ScheduleResult trySetValueAtTime(float value, double time) override;
+  ScheduleResult tryLinearRampToValueAtTime(float end_value, double end_time) override;
+  ScheduleResult trySetTargetAtTime(float target, double start_time, float time_constant) override;
+  ScheduleResult tryExponentialRampToValueAtTime(float value, double end_time) override;
+  ScheduleResult trySetValueCurveAtTime(NF_AUDIO_PARAM_CURVE values,
+                                        double start_time,
+                                        double duration) override;
+  ScheduleResult tryCancelAndHoldAtTime(double cancel_time) override;
+
+  // Diagnostics
+  LockWaitStatistics eventsMutexStatistics();
+  size_t eventsCount();
 
  private:
+  struct ModulationConnection {
+    std::shared_ptr<ParamImplementation> source;
+    float depth;
+    float offset;
+  };
+  // A connection in the modulation plan, from the source node at source_index
+  struct ModulationInput {
+    size_t source_index;
+    float depth;
+    float offset;
+  };
+  struct ModulationNode {
+    std::shared_ptr<ParamImplementation> param;
+    std::vector<ModulationInput> inputs;
+  };
+
   const float _default_value;
   const float _max_value;
   const float _min_value;
   const std::string _name;
-  std::list<EVENT_PTR> _events;
-  std::mutex _events_mutex;
+  // Shared with clones until either side edits them, see makeEventsUnique
+  std::shared_ptr<std::list<EVENT_PTR>> _events;
+  // Events scheduled in beats that a tempo change moved onto another event's required time range,
+  // which are ignored until a tempo change makes room for them. Shared along with _events
+  std::shared_ptr<std::list<EVENT_PTR>> _displaced_events;
+  // Seconds the events are shifted by, fixed once the param is created
+  double _time_offset;
+  ContentionMutex _events_mutex;
   std::vector<float> _smoothed_samples_buffer;
   std::map<double, std::map<double, float>> _cumulative_values_cache;
+  AutomationRate _automation_rate;
+  size_t _control_block_size;
+  ControlInterpolation _control_interpolation;
+  std::vector<float> _control_values_buffer;
+  RenderCache _render_cache;
+  // Incremented whenever the rendered timeline changes
+  uint64_t _timeline_version;
+  std::shared_ptr<TempoMap> _tempo_map;
+  // The tempo map version the events' times were last mapped with
+  uint64_t _tempo_map_version;
+  // Guarded by the modulation graph mutex rather than the events mutex
+  std::vector<ModulationConnection> _modulations;
+  // Every source upstream of this param after the sources modulating it, and this param's inputs
+  std::vector<ModulationNode> _modulation_plan;
+  std::vector<ModulationInput> _modulation_inputs;
+  // The modulation graph version the plan was built at
+  uint64_t _modulation_plan_version;
+  std::vector<std::vector<float>> _modulation_buffers;
+  // Created by reserveEvents, along with list nodes to splice events into and out of _events
+  std::shared_ptr<EventPool> _event_pool;
+  std::list<EVENT_PTR> _spare_events;
+
+  // Render the events at local times, without modulation, with the events mutex held
+  void renderEvents(float *values, size_t values_count, double start_time, double end_time);
+
+  // Render values_count values at start_time + i * step
+  void renderValues(float *values, size_t values_count, double start_time, double step);
+
+  // Render values_count values at start_time + i * step from one value per control block
+  void renderControlValues(float *values, size_t values_count, double start_time, double step);
 
   // Find the event (if any) that governs the param curve at the given time
-  std::list<std::unique_ptr<ParamEvent>>::iterator iteratorForTime(double time);
+  std::list<EVENT_PTR>::iterator iteratorForTime(double time);
 
   // Find the last event (if any) whose anchor time is <= time
-  std::list<std::unique_ptr<ParamEvent>>::iterator prevEvent(double time);
+  std::list<EVENT_PTR>::iterator prevEvent(double time);
+
+  // Find the first event (if any) whose event time is >= time, which is the start time of events
+  // anchored at their start and the end time of ramps
+  std::list<EVENT_PTR>::iterator nextEvent(double time);
+
+  // Copy the events if they are shared with a clone, before they are edited
+  void makeEventsUnique();
+
+  // Remove events from first onwards and let the new last event run on indefinitely
+  void eraseEvents(std::list<EVENT_PTR>::iterator first);
+
+  // Remove the events from first to last, keeping their list nodes if events are reserved
+  void releaseEvents(std::list<EVENT_PTR> &events,
+                     std::list<EVENT_PTR>::iterator first,
+                     std::list<EVENT_PTR>::iterator last);
+
+  // Move the displaced events that cancelling at cancel_time removes to the end of the displaced
+  // events, returning the first of them. Holding also removes the events in progress.
+  std::list<EVENT_PTR>::iterator cancelledDisplacedEvents(double cancel_time, bool hold);
 
   // Populate start and end with the required start and end of an event.
   // If the event's anchor is NONE, getRequiredTimeRange will return false.
@@ -92,6 +219,10 @@ class ParamImplementation : public Param {
   // If the event's anchor is ALL, end >= start.
   bool getRequiredTimeRange(const EVENT_PTR &event, double &start, double &end);
 
+  // Populate start and end with the required time range of an existing event that overlaps with
+  // event's. If there is none, findOverlap will return false.
+  bool findOverlap(const EVENT_PTR &event, double &start, double &end);
+
   // Throw an exception if an event overlaps with any existing events
   void checkOverlap(const EVENT_PTR &event);
 
@@ -102,6 +233,57 @@ class ParamImplementation : public Param {
   // Update adjacent events on insertion of a new event
   void addEvent(EVENT_PTR new_event, std::list<EVENT_PTR>::iterator prev_event);
 
+  // addEvent without checking for overlaps, in a spare list node if pooled_only
+  void insertEvent(EVENT_PTR new_event,
+                   std::list<EVENT_PTR>::iterator prev_event,
+                   bool pooled_only = false);
+
+  // Create an event in the event pool, or return an empty pointer if there is no room in one
+  template <typename EventClass, typename... Args>
+  EVENT_PTR newPooledEvent(Args &&... args);
+
+  // Create an event on the heap, keeping the event pool for the try* methods
+  template <typename EventClass, typename... Args>
+  EVENT_PTR newEvent(Args &&... args);
+
+  // Whether the try* methods can schedule without allocating, with the events mutex held
+  ScheduleResult checkRealTimeScheduling();
+
+  // Whether destroying the events from first to last only returns them to the event pool, so
+  // that the try* methods can remove them without freeing memory
+  bool releasesWithoutFreeing(std::list<EVENT_PTR>::iterator first,
+                              std::list<EVENT_PTR>::iterator last);
+
+  // Add events in order without allocating, unless any of them is empty or would overlap
+  ScheduleResult tryAddEvents(EVENT_PTR *events, size_t events_count);
+
+  // Shared by cancelAndHoldAtTime and tryCancelAndHoldAtTime, which only uses pooled events
+  ScheduleResult cancelAndHold(double cancel_time, bool pooled_only);
+
+  // Convert a beat to seconds with the current tempo map, throwing if there is none
+  double secondsForBeat(double beat);
+
+  // Remap events scheduled in beats if the tempo map changed since they were last mapped
+  void syncTempoMap();
+
+  // Remap the times of events scheduled at or after changed_beat, keep the events in order of
+  // their required time ranges, displace events that now overlap an earlier one, and update
+  // their neighbours
+  void remapEvents(double changed_beat);
+
+  // Rebuild the modulation plan if the modulation graph changed, returning whether it has inputs
+  bool updateModulationPlan();
+
+  // Add param and the sources modulating it to the plan, returning its index in the plan
+  size_t addModulationNode(const std::shared_ptr<ParamImplementation> &param,
+                           std::map<const ParamImplementation *, size_t> &node_indices);
+
+  // Render the sources in the plan between the same times, and add them to values
+  void applyModulation(float *values, size_t values_count, double start_time, double end_time);
+
+  // Whether param is this param or modulates it, directly or not, with the graph mutex held
+  bool isModulatedBy(const ParamImplementation *param) const;
+
   void invalidateCachedCumulativeValuesAfterTime(double time);
 };
 
@@ -0,0 +1,446 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#include "ParamKernels.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#define NF_PARAM_X86_KERNELS 1
+#include <immintrin.h>
+#define NF_PARAM_TARGET(isa) __attribute__((target(isa)))
+#else
+#define NF_PARAM_X86_KERNELS 0
+#endif
+
+namespace nativeformat {
+namespace param {
+
+namespace {
+
+double clampPosition(double position) {
+  return std::min(std::max(position, 0.0), 1.0);
+}
+
+void linearRampScalar(float *values,
+                      size_t values_count,
+                      double position,
+                      double position_step,
+                      double start_value,
+                      double end_value) {
+  for (size_t i = 0; i < values_count; ++i) {
+    double c = clampPosition(position + i * position_step);
+    values[i] = start_value + (end_value - start_value) * c;
+  }
+}
+
+void exponentialRampScalar(float *values,
+                           size_t values_count,
+                           double position,
+                           double position_step,
+                           double start_value,
+                           double base) {
+  for (size_t i = 0; i < values_count; ++i) {
+    double p = clampPosition(position + i * position_step);
+    values[i] = start_value * std::pow(base, p);
+  }
+}
+
+void targetApproachScalar(float *values,
+                          size_t values_count,
+                          double exponent,
+                          double exponent_step,
+                          double start_value,
+                          double target) {
+  for (size_t i = 0; i < values_count; ++i) {
+    double x = std::min(exponent + i * exponent_step, 0.0);
+    values[i] = target + (start_value - target) * std::exp(x);
+  }
+}
+
+void valueCurveScalar(float *values,
+                      size_t values_count,
+                      double position,
+                      double position_step,
+                      const float *curve,
+                      size_t curve_size) {
+  const double last = curve_size - 1;
+  for (size_t i = 0; i < values_count; ++i) {
+    double p = std::min(std::max(position + i * position_step, 0.0), last);
+    size_t k = std::min(static_cast<size_t>(p), curve_size - 2);
+    float v0 = curve[k];
+    float v1 = curve[k + 1];
+    values[i] = v0 + (v1 - v0) * (p / last);
+  }
+}
+
+const ParamKernels SCALAR_KERNELS = {InstructionSet::SCALAR,
+                                     linearRampScalar,
+                                     exponentialRampScalar,
+                                     targetApproachScalar,
+                                     valueCurveScalar};
+
+#if NF_PARAM_X86_KERNELS
+
+// Exponents outside this range under- or overflow the single precision kernels
+const double MAX_VECTOR_EXPONENT = 80.0;
+
+// Coefficients of the Cephes expf approximation
+const float EXP_HI = 88.3762626647949f;
+const float EXP_LO = -87.3365447504019f;
+const float LOG2E = 1.44269504088896341f;
+const float LN2_HI = 0.693359375f;
+const float LN2_LO = -2.12194440e-4f;
+const float EXP_P0 = 1.9875691500e-4f;
+const float EXP_P1 = 1.3981999507e-3f;
+const float EXP_P2 = 8.3334519073e-3f;
+const float EXP_P3 = 4.1665795894e-2f;
+const float EXP_P4 = 1.6666665459e-1f;
+const float EXP_P5 = 5.0000001201e-1f;
+
+bool vectorExponentialRampSupported(double start_value, double base) {
+  return std::isfinite(start_value) && base > 0.0 && std::isfinite(base) &&
+         std::abs(std::log(base)) <= MAX_VECTOR_EXPONENT;
+}
+
+NF_PARAM_TARGET("sse2") __m128 expSSE2(__m128 x) {
+  x = _mm_min_ps(_mm_max_ps(x, _mm_set1_ps(EXP_LO)), _mm_set1_ps(EXP_HI));
+
+  // n = floor(x / ln(2) + 0.5), computed without SSE4.1 rounding
+  __m128 fx = _mm_add_ps(_mm_mul_ps(x, _mm_set1_ps(LOG2E)), _mm_set1_ps(0.5f));
+  __m128 truncated = _mm_cvtepi32_ps(_mm_cvttps_epi32(fx));
+  __m128 too_large = _mm_cmpgt_ps(truncated, fx);
+  fx = _mm_sub_ps(truncated, _mm_and_ps(too_large, _mm_set1_ps(1.0f)));
+
+  // r = x - n * ln(2), so that exp(x) = 2^n * exp(r)
+  x = _mm_sub_ps(x, _mm_mul_ps(fx, _mm_set1_ps(LN2_HI)));
+  x = _mm_sub_ps(x, _mm_mul_ps(fx, _mm_set1_ps(LN2_LO)));
+  __m128 z = _mm_mul_ps(x, x);
+  __m128 y = _mm_set1_ps(EXP_P0);
+  y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(EXP_P1));
+  y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(EXP_P2));
+  y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(EXP_P3));
+  y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(EXP_P4));
+  y = _mm_add_ps(_mm_mul_ps(y, x), _mm_set1_ps(EXP_P5));
+  y = _mm_add_ps(_mm_add_ps(_mm_mul_ps(y, z), x), _mm_set1_ps(1.0f));
+
+  __m128i n = _mm_add_epi32(_mm_cvttps_epi32(fx), _mm_set1_epi32(0x7f));
+  return _mm_mul_ps(y, _mm_castsi128_ps(_mm_slli_epi32(n, 23)));
+}
+
+NF_PARAM_TARGET("sse2")
+void storeSSE2(float *values, size_t i, size_t values_count, __m128 v) {
+  if (i + 4 <= values_count) {
+    _mm_storeu_ps(values + i, v);
+  } else {
+    float tail[4];
+    _mm_storeu_ps(tail, v);
+    std::memcpy(values + i, tail, (values_count - i) * sizeof(float));
+  }
+}
+
+NF_PARAM_TARGET("sse2")
+__m128 positionsSSE2(double position, double position_step, size_t i, __m128 lane_steps) {
+  return _mm_add_ps(_mm_set1_ps(position + i * position_step), lane_steps);
+}
+
+NF_PARAM_TARGET("sse2")
+void linearRampSSE2(float *values,
+                    size_t values_count,
+                    double position,
+                    double position_step,
+                    double start_value,
+                    double end_value) {
+  const __m128 lane_steps =
+      _mm_mul_ps(_mm_set_ps(3.0f, 2.0f, 1.0f, 0.0f), _mm_set1_ps(position_step));
+  const __m128 start = _mm_set1_ps(start_value);
+  const __m128 delta = _mm_set1_ps(end_value - start_value);
+  const __m128 zero = _mm_setzero_ps();
+  const __m128 one = _mm_set1_ps(1.0f);
+  for (size_t i = 0; i < values_count; i += 4) {
+    __m128 p = positionsSSE2(position, position_step, i, lane_steps);
+    p = _mm_min_ps(_mm_max_ps(p, zero), one);
+    storeSSE2(values, i, values_count, _mm_add_ps(start, _mm_mul_ps(delta, p)));
+  }
+}
+
+NF_PARAM_TARGET("sse2")
+void exponentialRampSSE2(float *values,
+                         size_t values_count,
+                         double position,
+                         double position_step,
+                         double start_value,
+                         double base) {
+  if (!vectorExponentialRampSupported(start_value, base)) {
+    exponentialRampScalar(values, values_count, position, position_step, start_value, base);
+    return;
+  }
+  const __m128 lane_steps =
+      _mm_mul_ps(_mm_set_ps(3.0f, 2.0f, 1.0f, 0.0f), _mm_set1_ps(position_step));
+  const __m128 start = _mm_set1_ps(start_value);
+  const __m128 log_base = _mm_set1_ps(std::log(base));
+  const __m128 zero = _mm_setzero_ps();
+  const __m128 one = _mm_set1_ps(1.0f);
+  for (size_t i = 0; i < values_count; i += 4) {
+    __m128 p = positionsSSE2(position, position_step, i, lane_steps);
+    p = _mm_min_ps(_mm_max_ps(p, zero), one);
+    __m128 v = _mm_mul_ps(start, expSSE2(_mm_mul_ps(p, log_base)));
+    storeSSE2(values, i, values_count, v);
+  }
+}
+
+NF_PARAM_TARGET("sse2")
+void targetApproachSSE2(float *values,
+                        size_t values_count,
+                        double exponent,
+                        double exponent_step,
+                        double start_value,
+                        double target) {
+  const __m128 lane_steps =
+      _mm_mul_ps(_mm_set_ps(3.0f, 2.0f, 1.0f, 0.0f), _mm_set1_ps(exponent_step));
+  const __m128 target_v = _mm_set1_ps(target);
+  const __m128 delta = _mm_set1_ps(start_value - target);
+  const __m128 zero = _mm_setzero_ps();
+  for (size_t i = 0; i < values_count; i += 4) {
+    __m128 x = _mm_min_ps(positionsSSE2(exponent, exponent_step, i, lane_steps), zero);
+    __m128 v = _mm_add_ps(target_v, _mm_mul_ps(delta, expSSE2(x)));
+    storeSSE2(values, i, values_count, v);
+  }
+}
+
+NF_PARAM_TARGET("sse2")
+void valueCurveSSE2(float *values,
+                    size_t values_count,
+                    double position,
+                    double position_step,
+                    const float *curve,
+                    size_t curve_size) {
+  const double last = curve_size - 1;
+  const int last_index = static_cast<int>(curve_size - 2);
+  const __m128d lane_steps_lo = _mm_set_pd(position_step, 0.0);
+  const __m128d lane_steps_hi = _mm_set_pd(3.0 * position_step, 2.0 * position_step);
+  const __m128d zero = _mm_setzero_pd();
+  const __m128d last_v = _mm_set1_pd(last);
+  const __m128d inverse_last = _mm_set1_pd(1.0 / last);
+  int indices[4];
+  float v0[4], v1[4];
+  for (size_t i = 0; i < values_count; i += 4) {
+    __m128d base = _mm_set1_pd(position + i * position_step);
+    __m128d p_lo = _mm_min_pd(_mm_max_pd(_mm_add_pd(base, lane_steps_lo), zero), last_v);
+    __m128d p_hi = _mm_min_pd(_mm_max_pd(_mm_add_pd(base, lane_steps_hi), zero), last_v);
+    _mm_storeu_si128(reinterpret_cast<__m128i *>(indices),
+                     _mm_unpacklo_epi64(_mm_cvttpd_epi32(p_lo), _mm_cvttpd_epi32(p_hi)));
+    for (int lane = 0; lane < 4; ++lane) {
+      int k = std::min(indices[lane], last_index);
+      v0[lane] = curve[k];
+      v1[lane] = curve[k + 1];
+    }
+    __m128 w = _mm_movelh_ps(_mm_cvtpd_ps(_mm_mul_pd(p_lo, inverse_last)),
+                             _mm_cvtpd_ps(_mm_mul_pd(p_hi, inverse_last)));
+    __m128 a = _mm_loadu_ps(v0);
+    __m128 v = _mm_add_ps(a, _mm_mul_ps(_mm_sub_ps(_mm_loadu_ps(v1), a), w));
+    storeSSE2(values, i, values_count, v);
+  }
+}
+
+NF_PARAM_TARGET("avx2") __m256 expAVX2(__m256 x) {
+  x = _mm256_min_ps(_mm256_max_ps(x, _mm256_set1_ps(EXP_LO)), _mm256_set1_ps(EXP_HI));
+
+  // n = floor(x / ln(2) + 0.5)
+  __m256 fx = _mm256_floor_ps(
+      _mm256_add_ps(_mm256_mul_ps(x, _mm256_set1_ps(LOG2E)), _mm256_set1_ps(0.5f)));
+
+  // r = x - n * ln(2), so that exp(x) = 2^n * exp(r)
+  x = _mm256_sub_ps(x, _mm256_mul_ps(fx, _mm256_set1_ps(LN2_HI)));
+  x = _mm256_sub_ps(x, _mm256_mul_ps(fx, _mm256_set1_ps(LN2_LO)));
+  __m256 z = _mm256_mul_ps(x, x);
+  __m256 y = _mm256_set1_ps(EXP_P0);
+  y = _mm256_add_ps(_mm256_mul_ps(y, x), _mm256_set1_ps(EXP_P1));
+  y = _mm256_add_ps(_mm256_mul_ps(y, x), _mm256_set1_ps(EXP_P2));
+  y = _mm256_add_ps(_mm256_mul_ps(y, x), _mm256_set1_ps(EXP_P3));
+  y = _mm256_add_ps(_mm256_mul_ps(y, x), _mm256_set1_ps(EXP_P4));
+  y = _mm256_add_ps(_mm256_mul_ps(y, x), _mm256_set1_ps(EXP_P5));
+  y = _mm256_add_ps(_mm256_add_ps(_mm256_mul_ps(y, z), x), _mm256_set1_ps(1.0f));
+
+  __m256i n = _mm256_add_epi32(_mm256_cvttps_epi32(fx), _mm256_set1_epi32(0x7f));
+  return _mm256_mul_ps(y, _mm256_castsi256_ps(_mm256_slli_epi32(n, 23)));
+}
+
+NF_PARAM_TARGET("avx2")
+void storeAVX2(float *values, size_t i, size_t values_count, __m256 v) {
+  if (i + 8 <= values_count) {
+    _mm256_storeu_ps(values + i, v);
+  } else {
+    float tail[8];
+    _mm256_storeu_ps(tail, v);
+    std::memcpy(values + i, tail, (values_count - i) * sizeof(float));
+  }
+}
+
+NF_PARAM_TARGET("avx2")
+__m256 positionsAVX2(double position, double position_step, size_t i, __m256 lane_steps) {
+  return _mm256_add_ps(_mm256_set1_ps(position + i * position_step), lane_steps);
+}
+
+NF_PARAM_TARGET("avx2") __m256 laneStepsAVX2(double step) {
+  return _mm256_mul_ps(_mm256_set_ps(7.0f, 6.0f, 5.0f, 4.0f, 3.0f, 2.0f, 1.0f, 0.0f),
+                       _mm256_set1_ps(step));
+}
+
+NF_PARAM_TARGET("avx2")
+void linearRampAVX2(float *values,
+                    size_t values_count,
+                    double position,
+                    double position_step,
+                    double start_value,
+                    double end_value) {
+  const __m256 lane_steps = laneStepsAVX2(position_step);
+  const __m256 start = _mm256_set1_ps(start_value);
+  const __m256 delta = _mm256_set1_ps(end_value - start_value);
+  const __m256 zero = _mm256_setzero_ps();
+  const __m256 one = _mm256_set1_ps(1.0f);
+  for (size_t i = 0; i < values_count; i += 8) {
+    __m256 p = positionsAVX2(position, position_step, i, lane_steps);
+    p = _mm256_min_ps(_mm256_max_ps(p, zero), one);
+    storeAVX2(values, i, values_count, _mm256_add_ps(start, _mm256_mul_ps(delta, p)));
+  }
+}
+
+NF_PARAM_TARGET("avx2")
+void exponentialRampAVX2(float *values,
+                         size_t values_count,
+                         double position,
+                         double position_step,
+                         double start_value,
+                         double base) {
+  if (!vectorExponentialRampSupported(start_value, base)) {
+    exponentialRampScalar(values, values_count, position, position_step, start_value, base);
+    return;
+  }
+  const __m256 lane_steps = laneStepsAVX2(position_step);
+  const __m256 start = _mm256_set1_ps(start_value);
+  const __m256 log_base = _mm256_set1_ps(std::log(base));
+  const __m256 zero = _mm256_setzero_ps();
+  const __m256 one = _mm256_set1_ps(1.0f);
+  for (size_t i = 0; i < values_count; i += 8) {
+    __m256 p = positionsAVX2(position, position_step, i, lane_steps);
+    p = _mm256_min_ps(_mm256_max_ps(p, zero), one);
+    __m256 v = _mm256_mul_ps(start, expAVX2(_mm256_mul_ps(p, log_base)));
+    storeAVX2(values, i, values_count, v);
+  }
+}
+
+NF_PARAM_TARGET("avx2")
+void targetApproachAVX2(float *values,
+                        size_t values_count,
+                        double exponent,
+                        double exponent_step,
+                        double start_value,
+                        double target) {
+  const __m256 lane_steps = laneStepsAVX2(exponent_step);
+  const __m256 target_v = _mm256_set1_ps(target);
+  const __m256 delta = _mm256_set1_ps(start_value - target);
+  const __m256 zero = _mm256_setzero_ps();
+  for (size_t i = 0; i < values_count; i += 8) {
+    __m256 x = _mm256_min_ps(positionsAVX2(exponent, exponent_step, i, lane_steps), zero);
+    __m256 v = _mm256_add_ps(target_v, _mm256_mul_ps(delta, expAVX2(x)));
+    storeAVX2(values, i, values_count, v);
+  }
+}
+
+NF_PARAM_TARGET("avx2")
+void valueCurveAVX2(float *values,
+                    size_t values_count,
+                    double position,
+                    double position_step,
+                    const float *curve,
+                    size_t curve_size) {
+  const double last = curve_size - 1;
+  const __m256d lane_steps = _mm256_mul_pd(_mm256_set_pd(3.0, 2.0, 1.0, 0.0),
+                                           _mm256_set1_pd(position_step));
+  const __m256d zero = _mm256_setzero_pd();
+  const __m256d last_v = _mm256_set1_pd(last);
+  const __m256d inverse_last = _mm256_set1_pd(1.0 / last);
+  const __m128i last_index = _mm_set1_epi32(static_cast<int>(curve_size - 2));
+  const __m128i one = _mm_set1_epi32(1);
+  for (size_t i = 0; i < values_count; i += 4) {
+    __m256d p = _mm256_add_pd(_mm256_set1_pd(position + i * position_step), lane_steps);
+    p = _mm256_min_pd(_mm256_max_pd(p, zero), last_v);
+    __m128i k = _mm_min_epi32(_mm256_cvttpd_epi32(p), last_index);
+    __m128 v0 = _mm_i32gather_ps(curve, k, 4);
+    __m128 v1 = _mm_i32gather_ps(curve, _mm_add_epi32(k, one), 4);
+    __m128 w = _mm256_cvtpd_ps(_mm256_mul_pd(p, inverse_last));
+    __m128 v = _mm_add_ps(v0, _mm_mul_ps(_mm_sub_ps(v1, v0), w));
+    storeSSE2(values, i, values_count, v);
+  }
+}
+
+const ParamKernels SSE2_KERNELS = {InstructionSet::SSE2,
+                                   linearRampSSE2,
+                                   exponentialRampSSE2,
+                                   targetApproachSSE2,
+                                   valueCurveSSE2};
+
+const ParamKernels AVX2_KERNELS = {InstructionSet::AVX2,
+                                   linearRampAVX2,
+                                   exponentialRampAVX2,
+                                   targetApproachAVX2,
+                                   valueCurveAVX2};
+
+#endif  // NF_PARAM_X86_KERNELS
+
+const ParamKernels &bestKernels() {
+  const InstructionSet preferred[] = {InstructionSet::AVX2, InstructionSet::SSE2};
+  for (InstructionSet instruction_set : preferred) {
+    if (const ParamKernels *supported = kernelsForInstructionSet(instruction_set)) {
+      return *supported;
+    }
+  }
+  return SCALAR_KERNELS;
+}
+
+}  // namespace
+
+const ParamKernels &kernels() {
+  static const ParamKernels &best_kernels = bestKernels();
+  return best_kernels;
+}
+
+const ParamKernels *kernelsForInstructionSet(InstructionSet instruction_set) {
+  switch (instruction_set) {
+    case InstructionSet::SCALAR:
+      return &SCALAR_KERNELS;
+#if NF_PARAM_X86_KERNELS
+    case InstructionSet::SSE2:
+      __builtin_cpu_init();
+      return __builtin_cpu_supports("sse2") ? &SSE2_KERNELS : nullptr;
+    case InstructionSet::AVX2:
+      __builtin_cpu_init();
+      return __builtin_cpu_supports("avx2") ? &AVX2_KERNELS : nullptr;
+#endif
+    default:
+      return nullptr;
+  }
+}
+
+}  // namespace param
+}  // namespace nativeformat
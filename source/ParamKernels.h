@@ -0,0 +1,90 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#pragma once
+
+#include <cstddef>
+
+namespace nativeformat {
+namespace param {
+
+enum class InstructionSet { SCALAR = 0, SSE2 = 1, AVX2 = 2 };
+
+/* Block kernels used by the WAA events when rendering a range of values.
+ * Each kernel writes values_count samples, where sample i is evaluated at
+ * position + i * position_step.
+ *
+ * The SCALAR kernels evaluate the same double precision formulas as the
+ * events' valueAtTime methods. The SSE2 and AVX2 kernels evaluate in single
+ * precision with a polynomial exp approximation. Compared to the SCALAR
+ * kernels, their maximum error is:
+ *   linearRamp:       3 ulp of max(|start_value|, |end_value|)
+ *   valueCurve:       2 ulp of the largest magnitude in the curve
+ *   exponentialRamp:  (3 + 2 * |log(base)|) ulp of the result
+ *   targetApproach:   (2 + |exponent|) ulp of |start_value - target|,
+ *                     plus 1 ulp of the result
+ * where one ulp is 2^-23 relative to the quoted magnitude.
+ */
+struct ParamKernels {
+  InstructionSet instruction_set;
+
+  // start_value + (end_value - start_value) * clamp(position, 0, 1)
+  void (*linearRamp)(float *values,
+                     size_t values_count,
+                     double position,
+                     double position_step,
+                     double start_value,
+                     double end_value);
+
+  // start_value * pow(base, clamp(position, 0, 1))
+  void (*exponentialRamp)(float *values,
+                          size_t values_count,
+                          double position,
+                          double position_step,
+                          double start_value,
+                          double base);
+
+  // target + (start_value - target) * exp(min(exponent, 0))
+  void (*targetApproach)(float *values,
+                         size_t values_count,
+                         double exponent,
+                         double exponent_step,
+                         double start_value,
+                         double target);
+
+  // Interpolates curve at k = floor(position), clamped to the curve, with the
+  // interpolation weight position / (curve_size - 1) used by ValueCurveEvent.
+  // curve_size must be at least 2.
+  void (*valueCurve)(float *values,
+                     size_t values_count,
+                     double position,
+                     double position_step,
+                     const float *curve,
+                     size_t curve_size);
+};
+
+// The kernels for the best instruction set supported by the running CPU
+const ParamKernels &kernels();
+
+// The kernels for the given instruction set, or nullptr if the running CPU does not support it
+const ParamKernels *kernelsForInstructionSet(InstructionSet instruction_set);
+
+}  // namespace param
+}  // namespace nativeformat
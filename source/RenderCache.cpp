@@ -0,0 +1,99 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#include "RenderCache.h"
+
+#include <algorithm>
+
+namespace nativeformat {
+namespace param {
+
+RenderCache::RenderCache()
+    : _capacity(0), _cached_values(0), _hits(0), _misses(0), _version(0) {}
+
+RenderCache::~RenderCache() {}
+
+size_t RenderCache::capacity() const {
+  return _capacity;
+}
+
+void RenderCache::setCapacity(size_t max_cached_values) {
+  _capacity = max_cached_values;
+  evict(_capacity);
+}
+
+RenderCacheStatistics RenderCache::statistics() const {
+  RenderCacheStatistics statistics;
+  statistics.hits = _hits;
+  statistics.misses = _misses;
+  statistics.cached_values = _cached_values;
+  return statistics;
+}
+
+bool RenderCache::lookup(
+    uint64_t version, float *values, size_t values_count, double start_time, double end_time) {
+  if (version != _version) {
+    clear();
+    _version = version;
+  }
+  auto index_it = _index.find(KEY(start_time, end_time, values_count));
+  if (index_it == _index.end()) {
+    ++_misses;
+    return false;
+  }
+  ++_hits;
+  auto entry_it = index_it->second;
+  _entries.splice(_entries.begin(), _entries, entry_it);
+  std::copy(entry_it->values.begin(), entry_it->values.end(), values);
+  return true;
+}
+
+void RenderCache::insert(uint64_t version,
+                         const float *values,
+                         size_t values_count,
+                         double start_time,
+                         double end_time) {
+  KEY key(start_time, end_time, values_count);
+  if (version != _version || values_count > _capacity || _index.count(key) > 0) {
+    return;
+  }
+  evict(_capacity - values_count);
+  _entries.push_front(Entry{key, std::vector<float>(values, values + values_count)});
+  _index[key] = _entries.begin();
+  _cached_values += values_count;
+}
+
+void RenderCache::clear() {
+  _entries.clear();
+  _index.clear();
+  _cached_values = 0;
+}
+
+void RenderCache::evict(size_t max_cached_values) {
+  while (_cached_values > max_cached_values) {
+    const Entry &entry = _entries.back();
+    _cached_values -= entry.values.size();
+    _index.erase(entry.key);
+    _entries.pop_back();
+  }
+}
+
+}  // namespace param
+}  // namespace nativeformat
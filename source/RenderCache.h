@@ -0,0 +1,78 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#pragma once
+
+#include <cstdint>
+#include <list>
+#include <map>
+#include <tuple>
+#include <vector>
+
+#include <NFParam/Param.h>
+
+namespace nativeformat {
+namespace param {
+
+/* A least recently used cache of rendered value ranges, bounded by the total
+ * number of cached values. Entries are only valid for the timeline version
+ * they were rendered from; the cache empties itself the first time it is
+ * used with a newer version.
+ */
+class RenderCache {
+ public:
+  RenderCache();
+  virtual ~RenderCache();
+
+  size_t capacity() const;
+  void setCapacity(size_t max_cached_values);
+  RenderCacheStatistics statistics() const;
+
+  // Copy the cached values for the range into values, returning false on a miss
+  bool lookup(
+      uint64_t version, float *values, size_t values_count, double start_time, double end_time);
+  void insert(uint64_t version,
+              const float *values,
+              size_t values_count,
+              double start_time,
+              double end_time);
+
+ private:
+  typedef std::tuple<double, double, size_t> KEY;
+  struct Entry {
+    KEY key;
+    std::vector<float> values;
+  };
+
+  size_t _capacity;
+  size_t _cached_values;
+  size_t _hits;
+  size_t _misses;
+  uint64_t _version;
+  // Most recently used entries first
+  std::list<Entry> _entries;
+  std::map<KEY, std::list<Entry>::iterator> _index;
+
+  void clear();
+  void evict(size_t max_cached_values);
+};
+
+}  // namespace param
+}  // namespace nativeformat
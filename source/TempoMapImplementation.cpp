@@ -0,0 +1,165 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#include "TempoMapImplementation.h"
+
+#include <algorithm>
+#include <cmath>
+#include <limits>
+#include <stdexcept>
+
+namespace nativeformat {
+namespace param {
+
+TempoMapImplementation::TempoMapImplementation(double bpm)
+    : _version(0), _changed_beats(CHANGED_BEATS_HISTORY) {
+  if (bpm <= 0.0) {
+    throw std::invalid_argument("Tempo must be greater than 0 bpm");
+  }
+  _points.push_back(TempoPoint{0.0, bpm, false});
+  compileSegments(0);
+}
+
+TempoMapImplementation::~TempoMapImplementation() {}
+
+void TempoMapImplementation::setTempoAtBeat(double bpm, double beat) {
+  addPoint(bpm, beat, false);
+}
+
+void TempoMapImplementation::linearRampToTempoAtBeat(double bpm, double beat) {
+  addPoint(bpm, beat, true);
+}
+
+double TempoMapImplementation::tempoAtBeat(double beat) {
+  std::lock_guard<std::mutex> lock(_mutex);
+  const TempoSegment &segment = segmentForBeat(beat);
+  return segment.start_bpm + segment.bpm_per_beat * std::max(beat - segment.start_beat, 0.0);
+}
+
+double TempoMapImplementation::secondsForBeat(double beat) {
+  std::lock_guard<std::mutex> lock(_mutex);
+  return secondsInSegment(segmentForBeat(beat), beat);
+}
+
+double TempoMapImplementation::beatForSeconds(double seconds) {
+  std::lock_guard<std::mutex> lock(_mutex);
+  const TempoSegment &segment = segmentForSeconds(seconds);
+  double elapsed = seconds - segment.start_seconds;
+  if (segment.bpm_per_beat == 0.0 || elapsed < 0.0) {
+    return segment.start_beat + elapsed * segment.start_bpm / 60.0;
+  }
+  return segment.start_beat +
+         segment.start_bpm * std::expm1(segment.bpm_per_beat * elapsed / 60.0) /
+             segment.bpm_per_beat;
+}
+
+uint64_t TempoMapImplementation::version() const {
+  return _version;
+}
+
+double TempoMapImplementation::earliestChangedBeatSince(uint64_t version) {
+  std::lock_guard<std::mutex> lock(_mutex);
+  uint64_t current_version = _version;
+  if (current_version - version > CHANGED_BEATS_HISTORY) {
+    // The changes are no longer known, so every beat may have moved
+    return -std::numeric_limits<double>::infinity();
+  }
+  double earliest_beat = std::numeric_limits<double>::infinity();
+  for (uint64_t v = version; v < current_version; ++v) {
+    earliest_beat = std::min(earliest_beat, _changed_beats[v % CHANGED_BEATS_HISTORY]);
+  }
+  return earliest_beat;
+}
+
+void TempoMapImplementation::addPoint(double bpm, double beat, bool ramp) {
+  if (bpm <= 0.0) {
+    throw std::invalid_argument("Tempo must be greater than 0 bpm");
+  }
+  if (beat < 0.0) {
+    throw std::invalid_argument("Tempo points must not be before beat 0");
+  }
+  std::lock_guard<std::mutex> lock(_mutex);
+  auto it = std::lower_bound(
+      _points.begin(), _points.end(), beat, [](const TempoPoint &p, double b) {
+        return p.beat < b;
+      });
+  if (it != _points.end() && it->beat == beat) {
+    *it = TempoPoint{beat, bpm, ramp};
+  } else {
+    it = _points.insert(it, TempoPoint{beat, bpm, ramp});
+  }
+
+  // The segment leading up to the new point changes too
+  size_t index = it - _points.begin();
+  size_t first_changed = (index > 0) ? index - 1 : 0;
+  compileSegments(first_changed);
+  _changed_beats[_version % CHANGED_BEATS_HISTORY] = _points[first_changed].beat;
+  ++_version;
+}
+
+void TempoMapImplementation::compileSegments(size_t first_point) {
+  _segments.resize(_points.size());
+  for (size_t i = first_point; i < _points.size(); ++i) {
+    TempoSegment &segment = _segments[i];
+    segment.start_beat = _points[i].beat;
+    segment.start_seconds = (i == 0) ? 0.0 : secondsInSegment(_segments[i - 1], _points[i].beat);
+    segment.start_bpm = _points[i].bpm;
+    segment.bpm_per_beat = 0.0;
+    if (i + 1 < _points.size() && _points[i + 1].ramp) {
+      segment.bpm_per_beat =
+          (_points[i + 1].bpm - _points[i].bpm) / (_points[i + 1].beat - _points[i].beat);
+    }
+  }
+}
+
+const TempoMapImplementation::TempoSegment &TempoMapImplementation::segmentForBeat(
+    double beat) const {
+  auto it = std::upper_bound(
+      _segments.begin(), _segments.end(), beat, [](double b, const TempoSegment &segment) {
+        return b < segment.start_beat;
+      });
+  return (it == _segments.begin()) ? *it : *(it - 1);
+}
+
+const TempoMapImplementation::TempoSegment &TempoMapImplementation::segmentForSeconds(
+    double seconds) const {
+  auto it = std::upper_bound(
+      _segments.begin(), _segments.end(), seconds, [](double s, const TempoSegment &segment) {
+        return s < segment.start_seconds;
+      });
+  return (it == _segments.begin()) ? *it : *(it - 1);
+}
+
+double TempoMapImplementation::secondsInSegment(const TempoSegment &segment, double beat) {
+  double beats = beat - segment.start_beat;
+  if (segment.bpm_per_beat == 0.0 || beats < 0.0) {
+    return segment.start_seconds + beats * 60.0 / segment.start_bpm;
+  }
+  // Integrate 60 / (start_bpm + bpm_per_beat * b) over the beats
+  return segment.start_seconds +
+         60.0 / segment.bpm_per_beat * std::log1p(segment.bpm_per_beat * beats / segment.start_bpm);
+}
+
+std::shared_ptr<TempoMap> createTempoMap(double bpm) {
+  return std::make_shared<TempoMapImplementation>(bpm);
+}
+
+}  // namespace param
+}  // namespace nativeformat
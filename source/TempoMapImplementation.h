@@ -0,0 +1,84 @@
+/*
+ * Copyright (c) 2018 Spotify AB.
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+#pragma once
+
+#include <atomic>
+#include <mutex>
+#include <vector>
+
+#include <NFParam/TempoMap.h>
+
+namespace nativeformat {
+namespace param {
+
+class TempoMapImplementation : public TempoMap {
+ public:
+  TempoMapImplementation(double bpm);
+  virtual ~TempoMapImplementation();
+
+  void setTempoAtBeat(double bpm, double beat) override;
+  void linearRampToTempoAtBeat(double bpm, double beat) override;
+
+  double tempoAtBeat(double beat) override;
+  double secondsForBeat(double beat) override;
+  double beatForSeconds(double seconds) override;
+
+  uint64_t version() const override;
+  double earliestChangedBeatSince(uint64_t version) override;
+
+ private:
+  struct TempoPoint {
+    double beat;
+    double bpm;
+    bool ramp;
+  };
+
+  // The closed form of the tempo from one point to the next
+  struct TempoSegment {
+    double start_beat;
+    double start_seconds;
+    double start_bpm;
+    double bpm_per_beat;
+  };
+
+  std::mutex _mutex;
+  std::atomic<uint64_t> _version;
+  // Sorted by beat, the first point is always at beat 0
+  std::vector<TempoPoint> _points;
+  // One segment per point
+  std::vector<TempoSegment> _segments;
+  // The earliest beat changed by each of the most recent versions, indexed by the version before
+  // the change modulo CHANGED_BEATS_HISTORY
+  static const size_t CHANGED_BEATS_HISTORY = 64;
+  std::vector<double> _changed_beats;
+
+  void addPoint(double bpm, double beat, bool ramp);
+
+  // Recompute the segments from first_point onwards
+  void compileSegments(size_t first_point);
+
+  const TempoSegment &segmentForBeat(double beat) const;
+  const TempoSegment &segmentForSeconds(double seconds) const;
+  static double secondsInSegment(const TempoSegment &segment, double beat);
+};
+
+}  // namespace param
+}  // namespace nativeformat
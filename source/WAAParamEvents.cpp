@@ -21,11 +21,36 @@
 
 #include "WAAParamEvents.h"
 
+#include <algorithm>
 #include <cmath>
+#include <utility>
+
+#include "ParamKernels.h"
 
 namespace nativeformat {
 namespace param {
 
+namespace {
+
+const double TWO_PI = 6.283185307179586;
+
+// The value of a waveform at a phase in [0, 1)
+float waveformValue(Waveform waveform, double phase) {
+  switch (waveform) {
+    case Waveform::SINE:
+      return std::sin(TWO_PI * phase);
+    case Waveform::TRIANGLE:
+      return phase < 0.25 ? 4.0 * phase : (phase < 0.75 ? 2.0 - 4.0 * phase : 4.0 * phase - 4.0);
+    case Waveform::SQUARE:
+      return phase < 0.5 ? 1.0f : -1.0f;
+    case Waveform::SAWTOOTH:
+      return phase < 0.5 ? 2.0 * phase : 2.0 * phase - 2.0;
+  }
+  return 0.0f;
+}
+
+}  // namespace
+
 ValueAtTimeEvent::ValueAtTimeEvent(float value, double time)
     : ParamEvent(time, ParamEvent::INVALID_TIME, Anchor::START) {
   ParamEvent::start_value = value;
@@ -33,10 +58,21 @@ ValueAtTimeEvent::ValueAtTimeEvent(float value, double time)
 
 ValueAtTimeEvent::~ValueAtTimeEvent() {}
 
+std::unique_ptr<ParamEvent> ValueAtTimeEvent::clone() const {
+  return createEvent<ValueAtTimeEvent>(*this);
+}
+
 float ValueAtTimeEvent::valueAtTime(double time) {
   return start_value;
 }
 
+void ValueAtTimeEvent::valuesAtTime(float *values,
+                                    size_t values_count,
+                                    double start_time,
+                                    double time_step) {
+  std::fill(values, values + values_count, static_cast<float>(start_value));
+}
+
 float ValueAtTimeEvent::cumulativeValue(double start_time, double end_time, double precision) {
   // The integral of a delta function is equivalent to the value of the delta
   return start_value * (end_time - start_time);
@@ -49,6 +85,10 @@ TargetAtTimeEvent::TargetAtTimeEvent(float value, double time, float time_consta
 
 TargetAtTimeEvent::~TargetAtTimeEvent() {}
 
+std::unique_ptr<ParamEvent> TargetAtTimeEvent::clone() const {
+  return createEvent<TargetAtTimeEvent>(*this);
+}
+
 float TargetAtTimeEvent::valueAtTime(double time) {
   if (time < start_time) {
     return start_value;
@@ -56,6 +96,22 @@ float TargetAtTimeEvent::valueAtTime(double time) {
   return target + (start_value - target) * std::exp(-1.0 * ((time - start_time) / time_constant));
 }
 
+void TargetAtTimeEvent::valuesAtTime(float *values,
+                                     size_t values_count,
+                                     double start_time,
+                                     double time_step) {
+  if (time_constant <= 0.0f) {
+    ParamEvent::valuesAtTime(values, values_count, start_time, time_step);
+    return;
+  }
+  kernels().targetApproach(values,
+                           values_count,
+                           -1.0 * ((start_time - this->start_time) / time_constant),
+                           -1.0 * (time_step / time_constant),
+                           this->start_value,
+                           target);
+}
+
 float TargetAtTimeEvent::cumulativeValue(double start_time, double end_time, double precision) {
   // \int_{t1}^{t2} T + (s - T)*exp(-\frac{x-s}{c})dt =
   // Tx - \frac{s-T}{c}exp(-\frac{x-s}{c}) |_{t1}^{t2}
@@ -72,6 +128,10 @@ LinearRampEvent::LinearRampEvent(float value, double time)
     : ParamEvent(0.0, time, Anchor::END), target(value) {}
 LinearRampEvent::~LinearRampEvent() {}
 
+std::unique_ptr<ParamEvent> LinearRampEvent::clone() const {
+  return createEvent<LinearRampEvent>(*this);
+}
+
 float LinearRampEvent::valueAtTime(double time) {
   if (time < start_time || start_time == end_time) {
     return start_value;
@@ -83,6 +143,23 @@ float LinearRampEvent::valueAtTime(double time) {
   return start_value + (target - start_value) * c;
 }
 
+void LinearRampEvent::valuesAtTime(float *values,
+                                   size_t values_count,
+                                   double start_time,
+                                   double time_step) {
+  if (this->start_time == end_time) {
+    std::fill(values, values + values_count, static_cast<float>(start_value));
+    return;
+  }
+  double duration = end_time - this->start_time;
+  kernels().linearRamp(values,
+                       values_count,
+                       (start_time - this->start_time) / duration,
+                       time_step / duration,
+                       start_value,
+                       target);
+}
+
 float LinearRampEvent::cumulativeValue(double start_time, double end_time, double precision) {
   // int_{t1}^{t2}mx + bdx = 1/2 * mx^2 + bx|_{t1}^{t2}
   // neglecting coefficients and initial value on purpose
@@ -97,6 +174,10 @@ ExponentialRampEvent::ExponentialRampEvent(float value, double time)
 
 ExponentialRampEvent::~ExponentialRampEvent() {}
 
+std::unique_ptr<ParamEvent> ExponentialRampEvent::clone() const {
+  return createEvent<ExponentialRampEvent>(*this);
+}
+
 float ExponentialRampEvent::valueAtTime(double time) {
   if (time < start_time || start_time == end_time) {
     return start_value;
@@ -108,6 +189,23 @@ float ExponentialRampEvent::valueAtTime(double time) {
   return start_value * std::pow(base(), p);
 }
 
+void ExponentialRampEvent::valuesAtTime(float *values,
+                                        size_t values_count,
+                                        double start_time,
+                                        double time_step) {
+  if (this->start_time == end_time) {
+    std::fill(values, values + values_count, static_cast<float>(start_value));
+    return;
+  }
+  double duration = end_time - this->start_time;
+  kernels().exponentialRamp(values,
+                            values_count,
+                            (start_time - this->start_time) / duration,
+                            time_step / duration,
+                            start_value,
+                            base());
+}
+
 float ExponentialRampEvent::cumulativeValue(double start_time, double end_time, double precision) {
   // int_{t1}^{t2} a^b db = \frac{a^b}{logx} |_{t1}^{t2}
   auto integral = [this](const double &time) { return std::pow(this->base(), time); };
@@ -118,23 +216,143 @@ float ExponentialRampEvent::cumulativeValue(double start_time, double end_time,
 ValueCurveEvent::ValueCurveEvent(const std::vector<float> &values,
                                  double start_time,
                                  double duration)
+    : ValueCurveEvent(std::make_shared<const std::vector<float>>(values), start_time, duration) {}
+
+ValueCurveEvent::ValueCurveEvent(NF_AUDIO_PARAM_CURVE values, double start_time, double duration)
     : ParamEvent(start_time, start_time + duration, Anchor::ALL),
-      values(values),
+      values(std::move(values)),
       duration(duration) {
-  ParamEvent::start_value = values.front();
+  ParamEvent::start_value = this->values->front();
 }
 
 ValueCurveEvent::~ValueCurveEvent() {}
 
+std::unique_ptr<ParamEvent> ValueCurveEvent::clone() const {
+  return createEvent<ValueCurveEvent>(*this);
+}
+
 float ValueCurveEvent::valueAtTime(double time) {
+  const std::vector<float> &curve = *values;
   if (time > end_time) {
-    return values.back();
+    return curve.back();
   }
-  size_t n = values.size();
+  size_t n = curve.size();
   size_t k = std::floor((time - start_time) * (n - 1) / duration);
-  float v0 = values[k];
-  float v1 = values[k + 1];
-  return v0 + (v1 - v0) * (time - start_time) / (end_time - start_time);
+  float v0 = curve[k];
+  float v1 = curve[k + 1];
+  return v0 + (v1 - v0) * (time - start_time) / duration;
+}
+
+void ValueCurveEvent::valuesAtTime(float *values,
+                                   size_t values_count,
+                                   double start_time,
+                                   double time_step) {
+  const std::vector<float> &curve = *this->values;
+  if (curve.size() < 2) {
+    ParamEvent::valuesAtTime(values, values_count, start_time, time_step);
+    return;
+  }
+  double scale = (curve.size() - 1) / duration;
+  kernels().valueCurve(values,
+                       values_count,
+                       (start_time - this->start_time) * scale,
+                       time_step * scale,
+                       curve.data(),
+                       curve.size());
+}
+
+SegmentCurveEvent::SegmentCurveEvent(const std::vector<double> &times,
+                                     const std::vector<float> &values)
+    : ParamEvent(times.front(), times.back(), Anchor::ALL), times(times), values(values) {
+  ParamEvent::start_value = values.front();
+}
+
+SegmentCurveEvent::~SegmentCurveEvent() {}
+
+std::unique_ptr<ParamEvent> SegmentCurveEvent::clone() const {
+  return createEvent<SegmentCurveEvent>(*this);
+}
+
+float SegmentCurveEvent::valueAtTime(double time) {
+  if (time <= times.front()) {
+    return values.front();
+  }
+  if (time >= times.back()) {
+    return values.back();
+  }
+  size_t k = std::upper_bound(times.begin(), times.end(), time) - times.begin() - 1;
+  double c = (time - times[k]) / (times[k + 1] - times[k]);
+  return values[k] + (values[k + 1] - values[k]) * c;
+}
+
+void SegmentCurveEvent::valuesAtTime(float *values,
+                                     size_t values_count,
+                                     double start_time,
+                                     double time_step) {
+  auto time = [&](size_t i) { return start_time + i * time_step; };
+  size_t i = 0;
+  for (; i < values_count && time(i) <= times.front(); ++i) {
+    values[i] = this->values.front();
+  }
+  size_t k = 0;
+  while (i < values_count && time(i) < times.back()) {
+    // Render the run of samples within the segment containing sample i
+    while (times[k + 1] <= time(i)) {
+      ++k;
+    }
+    size_t run_start = i;
+    for (++i; i < values_count && time(i) < times[k + 1]; ++i) {
+    }
+    double duration = times[k + 1] - times[k];
+    kernels().linearRamp(values + run_start,
+                         i - run_start,
+                         (time(run_start) - times[k]) / duration,
+                         time_step / duration,
+                         this->values[k],
+                         this->values[k + 1]);
+  }
+  std::fill(values + i, values + values_count, this->values.back());
+}
+
+float SegmentCurveEvent::cumulativeValue(double start_time, double end_time, double precision) {
+  // Integrate exactly, with one trapezoid per segment
+  double cumulative_value = 0.0;
+  double time = start_time;
+  while (time < end_time) {
+    auto next_it = std::upper_bound(times.begin(), times.end(), time);
+    double next_time = (next_it == times.end()) ? end_time : std::min(*next_it, end_time);
+    cumulative_value += (valueAtTime(time) + valueAtTime(next_time)) * (next_time - time) / 2.;
+    time = next_time;
+  }
+  return cumulative_value;
+}
+
+OscillatorEvent::OscillatorEvent(Waveform waveform, float frequency, double start_time)
+    : ParamEvent(start_time, ParamEvent::INVALID_TIME, Anchor::START),
+      waveform(waveform),
+      frequency(frequency) {}
+
+OscillatorEvent::~OscillatorEvent() {}
+
+std::unique_ptr<ParamEvent> OscillatorEvent::clone() const {
+  return createEvent<OscillatorEvent>(*this);
+}
+
+float OscillatorEvent::valueAtTime(double time) {
+  double cycles = (time - start_time) * frequency;
+  return waveformValue(waveform, cycles - std::floor(cycles));
+}
+
+void OscillatorEvent::valuesAtTime(float *values,
+                                   size_t values_count,
+                                   double start_time,
+                                   double time_step) {
+  double start_cycles = (start_time - this->start_time) * frequency;
+  double cycles_step = time_step * frequency;
+  for (size_t i = 0; i < values_count; ++i) {
+    double cycles = start_cycles + i * cycles_step;
+    values[i] = waveformValue(waveform, cycles - std::floor(cycles));
+  }
 }
 
 DummyEvent::DummyEvent(float value) : ParamEvent(0.0, ParamEvent::INVALID_TIME, Anchor::NONE) {
@@ -143,9 +361,20 @@ DummyEvent::DummyEvent(float value) : ParamEvent(0.0, ParamEvent::INVALID_TIME,
 
 DummyEvent::~DummyEvent() {}
 
+std::unique_ptr<ParamEvent> DummyEvent::clone() const {
+  return createEvent<DummyEvent>(*this);
+}
+
 float DummyEvent::valueAtTime(double time) {
   return start_value;
 }
 
+void DummyEvent::valuesAtTime(float *values,
+                              size_t values_count,
+                              double start_time,
+                              double time_step) {
+  std::fill(values, values + values_count, static_cast<float>(start_value));
+}
+
 }  // namespace param
 }  // namespace nativeformat
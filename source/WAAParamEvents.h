@@ -20,9 +20,11 @@
  */
 #pragma once
 
+#include <NFParam/Param.h>
 #include <NFParam/ParamEvent.h>
 
 #include <memory>
+#include <utility>
 #include <vector>
 
 namespace nativeformat {
@@ -33,6 +35,11 @@ struct ValueAtTimeEvent : ParamEvent {
   virtual ~ValueAtTimeEvent();
 
   float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
 
   virtual float cumulativeValue(double start_time, double end_time, double precision = .1) override;
 };
@@ -45,6 +52,11 @@ struct TargetAtTimeEvent : ParamEvent {
   virtual ~TargetAtTimeEvent();
 
   float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
   virtual float cumulativeValue(double start_time, double end_time, double precision = .1) override;
 };
 
@@ -55,6 +67,11 @@ struct LinearRampEvent : ParamEvent {
   virtual ~LinearRampEvent();
 
   float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
   virtual float cumulativeValue(double start_time, double end_time, double precision = .1) override;
 };
 
@@ -65,6 +82,11 @@ struct ExponentialRampEvent : ParamEvent {
   virtual ~ExponentialRampEvent();
 
   float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
   virtual float cumulativeValue(double start_time, double end_time, double precision = .1) override;
 
  private:
@@ -72,13 +94,51 @@ struct ExponentialRampEvent : ParamEvent {
 };
 
 struct ValueCurveEvent : ParamEvent {
-  const std::vector<float> values;
-  const double duration;
+  const NF_AUDIO_PARAM_CURVE values;
+  double duration;
 
   ValueCurveEvent(const std::vector<float> &values, double start_time, double duration);
+  ValueCurveEvent(NF_AUDIO_PARAM_CURVE values, double start_time, double duration);
   virtual ~ValueCurveEvent();
 
   float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
+};
+
+// Linearly interpolates between values at arbitrary, increasing times
+struct SegmentCurveEvent : ParamEvent {
+  const std::vector<double> times;
+  const std::vector<float> values;
+
+  SegmentCurveEvent(const std::vector<double> &times, const std::vector<float> &values);
+  virtual ~SegmentCurveEvent();
+
+  float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
+  virtual float cumulativeValue(double start_time, double end_time, double precision = .1) override;
+};
+
+struct OscillatorEvent : ParamEvent {
+  const Waveform waveform;
+  const float frequency;
+
+  OscillatorEvent(Waveform waveform, float frequency, double start_time);
+  virtual ~OscillatorEvent();
+
+  float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
 };
 
 struct DummyEvent : ParamEvent {
@@ -86,11 +146,16 @@ struct DummyEvent : ParamEvent {
   virtual ~DummyEvent();
 
   float valueAtTime(double time) override;
+  void valuesAtTime(float *values,
+                    size_t values_count,
+                    double start_time,
+                    double time_step) override;
+  std::unique_ptr<ParamEvent> clone() const override;
 };
 
 template <typename EventClass, typename... Args>
-std::unique_ptr<EventClass> createEvent(Args... args) {
-  return std::unique_ptr<EventClass>(new EventClass(args...));
+std::unique_ptr<EventClass> createEvent(Args &&... args) {
+  return std::unique_ptr<EventClass>(new EventClass(std::forward<Args>(args)...));
 }
 
 }  // namespace param
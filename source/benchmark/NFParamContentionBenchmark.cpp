@@ -0,0 +1,280 @@
+/* Simulates audio threads rendering params at fixed block deadlines while
+ * control threads schedule events on the same params, and reports the render
+ * latency percentiles, missed deadlines and the wait time on the params'
+ * event mutexes. Missed deadlines depend on the machine, so they are reported
+ * rather than failing the run.
+ *
+ * Usage: NFParamContentionBenchmark [--option=value ...]
+ *   --audio-threads     audio threads, each rendering every param (default 1)
+ *   --control-threads   threads scheduling events (default 2)
+ *   --params            params shared by all threads (default 64)
+ *   --block-size        values rendered per param per block (default 256)
+ *   --sample-rate       samples per second (default 44100)
+ *   --duration          seconds to run for (default 5)
+ *   --schedule-rate     scheduling calls per second per control thread (default 10000)
+ *   --loop-length       seconds of the timeline rendered and scheduled in a loop (default 2)
+ *
+ * Looping keeps the number of events per param independent of the duration,
+ * so that runs of different lengths measure the same timelines.
+ */
+#include <NFParam/Param.h>
+#include "../ParamImplementation.h"
+
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <cstdio>
+#include <cstdlib>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <random>
+#include <stdexcept>
+#include <string>
+#include <thread>
+#include <vector>
+
+namespace {
+
+typedef std::chrono::steady_clock CLOCK;
+
+struct Options {
+  size_t audio_threads = 1;
+  size_t control_threads = 2;
+  size_t params = 64;
+  size_t block_size = 256;
+  double sample_rate = 44100.0;
+  double duration = 5.0;
+  double schedule_rate = 10000.0;
+  double loop_length = 2.0;
+};
+
+// The longest offset of a re-triggered envelope and of its ramp
+const double MAX_SCHEDULE_OFFSET = 0.5;
+
+Options parseOptions(int argc, char *argv[]) {
+  std::map<std::string, std::string> values;
+  for (int i = 1; i < argc; ++i) {
+    std::string argument(argv[i]);
+    size_t separator = argument.find('=');
+    if (argument.compare(0, 2, "--") != 0 || separator == std::string::npos) {
+      throw std::invalid_argument("Expected --option=value but got " + argument);
+    }
+    values[argument.substr(2, separator - 2)] = argument.substr(separator + 1);
+  }
+
+  Options options;
+  auto read = [&values](const std::string &name, double &option) {
+    auto it = values.find(name);
+    if (it != values.end()) {
+      option = std::stod(it->second);
+      values.erase(it);
+    }
+  };
+  auto read_count = [&read](const std::string &name, size_t &option) {
+    double value = option;
+    read(name, value);
+    option = static_cast<size_t>(value);
+  };
+  read_count("audio-threads", options.audio_threads);
+  read_count("control-threads", options.control_threads);
+  read_count("params", options.params);
+  read_count("block-size", options.block_size);
+  read("sample-rate", options.sample_rate);
+  read("duration", options.duration);
+  read("schedule-rate", options.schedule_rate);
+  read("loop-length", options.loop_length);
+  if (!values.empty()) {
+    throw std::invalid_argument("Unknown option --" + values.begin()->first);
+  }
+  if (options.params == 0 || options.block_size < 2) {
+    throw std::invalid_argument("Expected at least 1 param and a block size of at least 2");
+  }
+  if (options.loop_length <= 2 * MAX_SCHEDULE_OFFSET) {
+    throw std::invalid_argument("Expected a loop length of more than 1 second");
+  }
+  return options;
+}
+
+struct AudioThreadResult {
+  std::vector<std::chrono::nanoseconds> latencies;
+  size_t missed_deadlines = 0;
+};
+
+void renderAudio(const Options &options,
+                 const std::vector<std::shared_ptr<nativeformat::param::Param>> &params,
+                 CLOCK::time_point start,
+                 AudioThreadResult &result) {
+  std::vector<float> values(options.block_size);
+  double block_duration = options.block_size / options.sample_rate;
+  auto block_period = std::chrono::duration_cast<CLOCK::duration>(
+      std::chrono::duration<double>(block_duration));
+  size_t blocks = static_cast<size_t>(options.duration / block_duration);
+  result.latencies.reserve(blocks);
+
+  for (size_t block = 0; block < blocks; ++block) {
+    auto deadline = start + block_period * (block + 1);
+    double start_time = std::fmod(block * block_duration, options.loop_length);
+    double end_time = start_time + (options.block_size - 1) / options.sample_rate;
+
+    auto render_start = CLOCK::now();
+    for (const auto &param : params) {
+      param->valuesForTimeRange(values.data(), values.size(), start_time, end_time);
+    }
+    auto render_end = CLOCK::now();
+
+    result.latencies.push_back(
+        std::chrono::duration_cast<std::chrono::nanoseconds>(render_end - render_start));
+    if (render_end > deadline) {
+      ++result.missed_deadlines;
+    }
+    std::this_thread::sleep_until(deadline);
+  }
+}
+
+void scheduleEvents(const Options &options,
+                    const std::vector<std::shared_ptr<nativeformat::param::Param>> &params,
+                    CLOCK::time_point start,
+                    unsigned int seed,
+                    const std::atomic<bool> &running,
+                    std::atomic<size_t> &scheduled) {
+  std::mt19937 generator(seed);
+  std::uniform_int_distribution<size_t> param_distribution(0, params.size() - 1);
+  std::uniform_real_distribution<float> value_distribution(0.0f, 1.0f);
+  std::uniform_real_distribution<double> offset_distribution(0.01, MAX_SCHEDULE_OFFSET);
+  auto period = std::chrono::duration_cast<CLOCK::duration>(
+      std::chrono::duration<double>(1.0 / options.schedule_rate));
+
+  auto next = CLOCK::now();
+  while (running) {
+    // Re-trigger an envelope a little ahead of the play position, keeping its ramp in the loop
+    auto &param = params[param_distribution(generator)];
+    double now = std::chrono::duration<double>(CLOCK::now() - start).count();
+    double time = std::fmod(now + offset_distribution(generator),
+                            options.loop_length - MAX_SCHEDULE_OFFSET);
+    try {
+      param->cancelScheduledValues(time);
+      param->setValueAtTime(value_distribution(generator), time);
+      param->linearRampToValueAtTime(value_distribution(generator),
+                                     time + offset_distribution(generator));
+      scheduled += 3;
+    } catch (const std::invalid_argument &) {
+      // Conflicting events are expected with random scheduling
+    }
+    next += period;
+    std::this_thread::sleep_until(next);
+  }
+}
+
+double microseconds(std::chrono::nanoseconds duration) {
+  return duration.count() / 1000.0;
+}
+
+}  // namespace
+
+int main(int argc, char *argv[]) {
+  Options options;
+  try {
+    options = parseOptions(argc, argv);
+  } catch (const std::exception &e) {
+    std::fprintf(stderr, "%s\n", e.what());
+    return EXIT_FAILURE;
+  }
+
+  std::vector<std::shared_ptr<nativeformat::param::Param>> params;
+  for (size_t i = 0; i < options.params; ++i) {
+    auto param = nativeformat::param::createParam(0.0f, 1.0f, 0.0f, "param" + std::to_string(i));
+    param->setValueAtTime(0.5f, 0.0);
+    params.push_back(param);
+  }
+
+  std::atomic<bool> running(true);
+  std::atomic<size_t> scheduled(0);
+  std::vector<AudioThreadResult> results(options.audio_threads);
+  std::vector<std::thread> audio_threads, control_threads;
+  auto start = CLOCK::now();
+  for (size_t i = 0; i < options.control_threads; ++i) {
+    control_threads.emplace_back(scheduleEvents,
+                                 std::cref(options),
+                                 std::cref(params),
+                                 start,
+                                 static_cast<unsigned int>(i),
+                                 std::cref(running),
+                                 std::ref(scheduled));
+  }
+  for (size_t i = 0; i < options.audio_threads; ++i) {
+    audio_threads.emplace_back(
+        renderAudio, std::cref(options), std::cref(params), start, std::ref(results[i]));
+  }
+  for (auto &thread : audio_threads) {
+    thread.join();
+  }
+  running = false;
+  for (auto &thread : control_threads) {
+    thread.join();
+  }
+
+  std::vector<std::chrono::nanoseconds> latencies;
+  size_t missed_deadlines = 0;
+  for (const auto &result : results) {
+    latencies.insert(latencies.end(), result.latencies.begin(), result.latencies.end());
+    missed_deadlines += result.missed_deadlines;
+  }
+  if (latencies.empty()) {
+    std::fprintf(stderr, "No blocks were rendered, increase the duration\n");
+    return EXIT_FAILURE;
+  }
+  std::sort(latencies.begin(), latencies.end());
+  auto percentile = [&latencies](double p) {
+    size_t index = static_cast<size_t>(p / 100.0 * (latencies.size() - 1) + 0.5);
+    return microseconds(latencies[index]);
+  };
+
+  nativeformat::param::LockWaitStatistics lock_statistics{
+      0, 0, std::chrono::nanoseconds(0), std::chrono::nanoseconds(0)};
+  for (const auto &param : params) {
+    auto statistics =
+        std::static_pointer_cast<nativeformat::param::ParamImplementation>(param)
+            ->eventsMutexStatistics();
+    lock_statistics.locks += statistics.locks;
+    lock_statistics.contended_locks += statistics.contended_locks;
+    lock_statistics.total_wait += statistics.total_wait;
+    lock_statistics.max_wait = std::max(lock_statistics.max_wait, statistics.max_wait);
+  }
+  size_t events = 0;
+  size_t max_events = 0;
+  for (const auto &param : params) {
+    size_t param_events =
+        std::static_pointer_cast<nativeformat::param::ParamImplementation>(param)->eventsCount();
+    events += param_events;
+    max_events = std::max(max_events, param_events);
+  }
+
+  double block_duration_us = options.block_size / options.sample_rate * 1e6;
+  std::printf("audio threads: %zu, control threads: %zu, params: %zu, block: %zu (%.1f us)\n",
+              options.audio_threads,
+              options.control_threads,
+              options.params,
+              options.block_size,
+              block_duration_us);
+  std::printf("blocks rendered: %zu, events scheduled: %zu\n", latencies.size(), scheduled.load());
+  std::printf("events per param: mean %.1f  max %zu (loop %.1f s)\n",
+              static_cast<double>(events) / params.size(),
+              max_events,
+              options.loop_length);
+  std::printf("render latency (us): p50 %.1f  p99 %.1f  p99.9 %.1f  max %.1f\n",
+              percentile(50.0),
+              percentile(99.0),
+              percentile(99.9),
+              microseconds(latencies.back()));
+  std::printf("missed deadlines: %zu (%.3f%%)\n",
+              missed_deadlines,
+              100.0 * missed_deadlines / latencies.size());
+  std::printf("events mutex: %zu locks, %zu contended, total wait %.1f us, max wait %.1f us\n",
+              lock_statistics.locks,
+              lock_statistics.contended_locks,
+              microseconds(lock_statistics.total_wait),
+              microseconds(lock_statistics.max_wait));
+  return EXIT_SUCCESS;
+}
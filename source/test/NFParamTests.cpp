@@ -2,13 +2,18 @@
 
 #include <NFParam/Param.h>
 #include <NFParam/ParamEvent.h>
+#include <NFParam/TempoMap.h>
+#include "../source/CurveSimplification.h"
+#include "../source/ParamKernels.h"
 #include "../source/WAAParamEvents.h"
 
 #include <catch.hpp>
 
+#include <algorithm>
 #include <cmath>
 #include <cstdio>
 #include <fstream>
+#include <limits>
 #include <vector>
 
 TEST_CASE("order of setValueAtTime commands should not matter") {
@@ -342,3 +347,610 @@ TEST_CASE("setValue should set value for all times") {
   CHECK(p->valueForTime(10.0) == Approx(v));
   CHECK(p->valueForTime(100.0) == Approx(v));
 }
+
+TEST_CASE("valuesForTimeRange should match valueForTime for every event type") {
+  std::vector<float> curve{0.0f, 0.5f, 1.0f, 0.25f, 0.75f};
+  auto p = nativeformat::param::createParam(0.5f, 10.0f, -10.0f, "testParam");
+  p->setValueAtTime(0.2f, 0.0);
+  p->linearRampToValueAtTime(1.0f, 1.0);
+  p->exponentialRampToValueAtTime(4.0f, 2.0);
+  p->setTargetAtTime(-2.0f, 2.5, 0.3f);
+  p->setValueCurveAtTime(curve, 4.0, 1.5);
+  p->addCustomEvent(
+      5.5, 6.0, nativeformat::param::Anchor::ALL, [](double t) { return std::sin(t); });
+
+  // Sample on a grid that lands exactly on every event boundary
+  size_t count = 7 * 64 + 1;
+  double step = 1.0 / 64;
+  std::vector<float> values(count);
+  p->valuesForTimeRange(values.data(), count, 0.0, 7.0);
+  double t = 0.0;
+  for (size_t i = 0; i < count; ++i, t += step) {
+    INFO("time: " << t);
+    CHECK(values[i] == Approx(p->valueForTime(t)).epsilon(1e-5).margin(1e-5));
+  }
+}
+
+TEST_CASE("Vectorized kernels should match the scalar kernels within their error bounds") {
+  using nativeformat::param::InstructionSet;
+  const auto &scalar = *nativeformat::param::kernelsForInstructionSet(InstructionSet::SCALAR);
+  const double ulp = std::ldexp(1.0, -23);
+  const size_t count = 1003;
+  std::vector<float> expected(count), actual(count);
+  std::vector<float> curve{0.0f, -2.0f, 3.5f, 1.0f, 0.25f, -0.75f, 2.0f};
+
+  for (auto instruction_set : {InstructionSet::SSE2, InstructionSet::AVX2}) {
+    const auto *kernels = nativeformat::param::kernelsForInstructionSet(instruction_set);
+    if (!kernels) {
+      continue;
+    }
+    INFO("instruction set: " << static_cast<int>(instruction_set));
+    CHECK(kernels->instruction_set == instruction_set);
+
+    scalar.linearRamp(expected.data(), count, -0.1, 1.2 / count, -3.0, 7.0);
+    kernels->linearRamp(actual.data(), count, -0.1, 1.2 / count, -3.0, 7.0);
+    for (size_t i = 0; i < count; ++i) {
+      CHECK(std::abs(actual[i] - expected[i]) <= 3 * ulp * 7.0);
+    }
+
+    double base = 1e-4;
+    scalar.exponentialRamp(expected.data(), count, -0.1, 1.2 / count, 2.0, base);
+    kernels->exponentialRamp(actual.data(), count, -0.1, 1.2 / count, 2.0, base);
+    for (size_t i = 0; i < count; ++i) {
+      double bound = (3 + 2 * std::abs(std::log(base))) * ulp * std::abs(expected[i]);
+      CHECK(std::abs(actual[i] - expected[i]) <= bound);
+    }
+
+    scalar.targetApproach(expected.data(), count, 0.5, -20.0 / count, 1.0, -0.5);
+    kernels->targetApproach(actual.data(), count, 0.5, -20.0 / count, 1.0, -0.5);
+    for (size_t i = 0; i < count; ++i) {
+      double exponent = std::min(0.5 - 20.0 * i / count, 0.0);
+      double bound = (2 + std::abs(exponent)) * ulp * 1.5 + ulp * std::abs(expected[i]);
+      CHECK(std::abs(actual[i] - expected[i]) <= bound);
+    }
+
+    scalar.valueCurve(expected.data(), count, -1.0, 8.0 / count, curve.data(), curve.size());
+    kernels->valueCurve(actual.data(), count, -1.0, 8.0 / count, curve.data(), curve.size());
+    for (size_t i = 0; i < count; ++i) {
+      CHECK(std::abs(actual[i] - expected[i]) <= 2 * ulp * 3.5);
+    }
+  }
+}
+
+TEST_CASE("cancelScheduledValues should remove events at and after the cancel time") {
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, -4.0f, "testParam");
+  p->setValueAtTime(1.0f, 1.0);
+  p->linearRampToValueAtTime(3.0f, 2.0);
+  p->setValueAtTime(-1.0f, 3.0);
+  p->cancelScheduledValues(1.5);
+
+  CHECK(p->valueForTime(0.5) == Approx(0.0f));
+  CHECK(p->valueForTime(1.75) == Approx(1.0f));
+  CHECK(p->valueForTime(3.5) == Approx(1.0f));
+
+  // Events can be scheduled again after cancelling
+  p->linearRampToValueAtTime(2.0f, 3.0);
+  CHECK(p->valueForTime(2.0) == Approx(1.5f));
+  CHECK(p->valueForTime(4.0) == Approx(2.0f));
+
+  p->cancelScheduledValues(0.0);
+  CHECK(p->valueForTime(2.0) == Approx(0.0f));
+
+  // A curve in progress started before the cancel time, so it is kept
+  p->setValueCurveAtTime({0.0f, 1.0f, 2.0f, 3.0f, 4.0f}, 0.0, 4.0);
+  p->setValueAtTime(-1.0f, 5.0);
+  p->cancelScheduledValues(2.0);
+  CHECK(p->valueForTime(1.0) == Approx(1.25f));
+  CHECK(p->valueForTime(3.0) == Approx(3.75f));
+  CHECK(p->valueForTime(5.5) == Approx(0.0f));
+}
+
+TEST_CASE("cancelAndHoldAtTime should hold the value of a ramp in progress") {
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, -4.0f, "testParam");
+  p->setValueAtTime(1.0f, 1.0);
+  p->linearRampToValueAtTime(3.0f, 3.0);
+  p->exponentialRampToValueAtTime(0.5f, 4.0);
+  p->cancelAndHoldAtTime(2.0);
+
+  CHECK(p->valueForTime(1.5) == Approx(1.5f));
+  CHECK(p->valueForTime(2.0) == Approx(2.0f));
+  CHECK(p->valueForTime(3.5) == Approx(2.0f));
+  CHECK(p->valueForTime(10.0) == Approx(2.0f));
+
+  size_t count = 5;
+  std::vector<float> values(count);
+  std::vector<float> expected_values{0.0f, 1.0f, 2.0f, 2.0f, 2.0f};
+  p->valuesForTimeRange(values.data(), count, 0.0, 4.0);
+  for (size_t i = 0; i < count; ++i) {
+    CHECK(values[i] == Approx(expected_values[i]));
+  }
+}
+
+TEST_CASE("cancelAndHoldAtTime should hold target and curve values") {
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, -4.0f, "testParam");
+  p->setValueAtTime(1.0f, 0.0);
+  p->setTargetAtTime(0.0f, 1.0, 0.5f);
+  p->setValueAtTime(2.0f, 3.0);
+  p->cancelAndHoldAtTime(2.0);
+  float held_value = std::exp(-2.0);
+  CHECK(p->valueForTime(1.5) == Approx(std::exp(-1.0)));
+  CHECK(p->valueForTime(2.5) == Approx(held_value));
+  CHECK(p->valueForTime(3.5) == Approx(held_value));
+
+  std::vector<float> curve{0.0f, 1.0f, 2.0f, 3.0f, 4.0f};
+  p = nativeformat::param::createParam(0.0f, 4.0f, -4.0f, "testParam");
+  p->setValueCurveAtTime(curve, 0.0, 4.0);
+  float curve_value = p->valueForTime(2.5);
+  p->cancelAndHoldAtTime(2.5);
+  CHECK(p->valueForTime(1.0) == Approx(1.25f));
+  CHECK(p->valueForTime(2.5) == Approx(curve_value));
+  CHECK(p->valueForTime(3.5) == Approx(curve_value));
+}
+
+TEST_CASE("Control rate params should hold one value per control block") {
+  auto p = nativeformat::param::createParam(0.0f, 16.0f, 0.0f, "testParam");
+  p->linearRampToValueAtTime(16.0f, 16.0);
+  CHECK(p->automationRate() == nativeformat::param::AutomationRate::AUDIO);
+  p->setAutomationRate(nativeformat::param::AutomationRate::CONTROL, 4);
+  CHECK(p->automationRate() == nativeformat::param::AutomationRate::CONTROL);
+
+  size_t count = 10;
+  std::vector<float> values(count);
+  std::vector<float> expected_values{0, 0, 0, 0, 4, 4, 4, 4, 8, 8};
+  p->valuesForTimeRange(values.data(), count, 0.0, 9.0);
+  for (size_t i = 0; i < count; ++i) {
+    CHECK(values[i] == Approx(expected_values[i]));
+  }
+}
+
+TEST_CASE("Control rate params should interpolate linearly between control blocks") {
+  auto p = nativeformat::param::createParam(0.0f, 16.0f, 0.0f, "testParam");
+  p->setValueAtTime(2.0f, 0.0);
+  p->setValueAtTime(10.0f, 4.0);
+  p->setAutomationRate(nativeformat::param::AutomationRate::CONTROL,
+                       4,
+                       nativeformat::param::ControlInterpolation::LINEAR);
+
+  size_t count = 10;
+  std::vector<float> values(count);
+  std::vector<float> expected_values{2, 4, 6, 8, 10, 10, 10, 10, 10, 10};
+  p->valuesForTimeRange(values.data(), count, 0.0, 9.0);
+  for (size_t i = 0; i < count; ++i) {
+    CHECK(values[i] == Approx(expected_values[i]));
+  }
+
+  CHECK_THROWS_AS(p->setAutomationRate(nativeformat::param::AutomationRate::CONTROL, 0),
+                  std::invalid_argument);
+}
+
+TEST_CASE("Rendered ranges should be served from the render cache until events change") {
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, 0.0f, "testParam");
+  p->linearRampToValueAtTime(4.0f, 4.0);
+  p->setRenderCacheCapacity(16);
+
+  size_t count = 5;
+  std::vector<float> values(count), cached_values(count);
+  p->valuesForTimeRange(values.data(), count, 0.0, 4.0);
+  p->valuesForTimeRange(cached_values.data(), count, 0.0, 4.0);
+  CHECK(cached_values == values);
+  auto statistics = p->renderCacheStatistics();
+  CHECK(statistics.hits == 1);
+  CHECK(statistics.misses == 1);
+  CHECK(statistics.cached_values == count);
+
+  // Changing the events invalidates the cached ranges
+  p->setValueAtTime(1.0f, 2.0);
+  p->valuesForTimeRange(values.data(), count, 0.0, 4.0);
+  CHECK(values[2] == Approx(1.0f));
+  statistics = p->renderCacheStatistics();
+  CHECK(statistics.hits == 1);
+  CHECK(statistics.misses == 2);
+}
+
+TEST_CASE("The render cache should evict the least recently used ranges") {
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, 0.0f, "testParam");
+  p->linearRampToValueAtTime(4.0f, 4.0);
+  p->setRenderCacheCapacity(8);
+
+  std::vector<float> values(4);
+  p->valuesForTimeRange(values.data(), 4, 0.0, 1.0);
+  p->valuesForTimeRange(values.data(), 4, 1.0, 2.0);
+  p->valuesForTimeRange(values.data(), 4, 0.0, 1.0);
+  p->valuesForTimeRange(values.data(), 4, 2.0, 3.0);
+  CHECK(p->renderCacheStatistics().cached_values == 8);
+
+  // 1.0 - 2.0 was least recently used, so it was evicted to make room for 2.0 - 3.0
+  p->valuesForTimeRange(values.data(), 4, 0.0, 1.0);
+  p->valuesForTimeRange(values.data(), 4, 1.0, 2.0);
+  auto statistics = p->renderCacheStatistics();
+  CHECK(statistics.hits == 2);
+  CHECK(statistics.misses == 4);
+  CHECK(values[3] == Approx(2.0f));
+
+  // Ranges larger than the capacity are never cached
+  std::vector<float> large_values(16);
+  p->valuesForTimeRange(large_values.data(), 16, 0.0, 4.0);
+  CHECK(p->renderCacheStatistics().cached_values == 8);
+}
+
+TEST_CASE("Simplified value curves should drop collinear values") {
+  size_t curve_len = 1000;
+  std::vector<float> curve(curve_len);
+  for (size_t i = 0; i < curve_len; ++i) {
+    curve[i] = (i < curve_len / 2) ? i / 500.0f : 1.0f;
+  }
+  auto p = nativeformat::param::createParam(0.0f, 1.0f, 0.0f, "testParam");
+  size_t removed = p->setSimplifiedValueCurveAtTime(curve, 1.0, 1.0, 1e-6f);
+  CHECK(removed == curve_len - 3);
+
+  CHECK(p->valueForTime(0.5) == Approx(0.0f));
+  CHECK(p->valueForTime(1.25) == Approx(0.5f).epsilon(0.01));
+  CHECK(p->valueForTime(1.75) == Approx(1.0f));
+  CHECK(p->cumulativeValueForTimeRange(1.0, 2.0) == Approx(0.75f).epsilon(0.01));
+}
+
+TEST_CASE("Simplified value curves should stay within tolerance of the full curve") {
+  size_t curve_len = 44100;
+  std::vector<float> curve(curve_len);
+  for (size_t i = 0; i < curve_len; ++i) {
+    curve[i] = std::sin((3.14159265 * i) / curve_len);
+  }
+  float tolerance = 1e-3f;
+  auto p = nativeformat::param::createParam(0.0f, 1.0f, 0.0f, "testParam");
+  size_t removed = p->setSimplifiedValueCurveAtTime(curve, 0.0, 1.0, tolerance);
+  CHECK(removed > curve_len - 100);
+
+  std::vector<float> values(curve_len);
+  p->valuesForTimeRange(values.data(), curve_len, 0.0, 1.0);
+  float max_error = 0.0f;
+  for (size_t i = 0; i < curve_len; ++i) {
+    max_error = std::max(max_error, std::abs(values[i] - curve[i]));
+  }
+  CHECK(max_error <= tolerance + 1e-5f);
+
+  CHECK_THROWS_AS(p->setSimplifiedValueCurveAtTime({1.0f}, 2.0, 1.0, tolerance),
+                  std::invalid_argument);
+  CHECK_THROWS_AS(p->setSimplifiedValueCurveAtTime({0.0f, 0.5f, 1.0f}, 2.0, 1.0, -0.1f),
+                  std::invalid_argument);
+  CHECK_THROWS_AS(p->setSimplifiedValueCurveAtTime(
+                      {0.0f, 0.5f, 1.0f}, 2.0, 1.0, std::numeric_limits<float>::quiet_NaN()),
+                  std::invalid_argument);
+  CHECK_THROWS_AS(p->setSimplifiedValueCurveAtTime(
+                      {0.0f, 0.5f, 1.0f}, 2.0, 1.0, std::numeric_limits<float>::infinity()),
+                  std::invalid_argument);
+}
+
+TEST_CASE("Curve simplification should stop splitting segments without inner values") {
+  std::vector<float> curve{0.0f, 0.5f, 1.0f};
+  CHECK(nativeformat::param::simplifyCurve(curve, 0.0f) == std::vector<size_t>({0, 2}));
+  CHECK(nativeformat::param::simplifyCurve(curve, -0.1f) == std::vector<size_t>({0, 1, 2}));
+}
+
+TEST_CASE("Shared value curves should be used by many params without copying") {
+  std::vector<float> curve{0.0f, 1.0f, 2.0f, 3.0f, 4.0f};
+  nativeformat::param::NF_AUDIO_PARAM_CURVE shared_curve =
+      std::make_shared<const std::vector<float>>(curve);
+
+  std::vector<std::shared_ptr<nativeformat::param::Param>> params;
+  for (int i = 0; i < 4; ++i) {
+    auto p = nativeformat::param::createParam(0.0f, 4.0f, 0.0f, "testParam");
+    p->setValueCurveAtTime(shared_curve, i, 4.0);
+    params.push_back(p);
+  }
+  CHECK(shared_curve.use_count() == 5);
+
+  auto copied = nativeformat::param::createParam(0.0f, 4.0f, 0.0f, "testParam");
+  copied->setValueCurveAtTime(curve, 0.0, 4.0);
+  for (int i = 0; i < 4; ++i) {
+    CHECK(params[i]->valueForTime(i + 2.5) == Approx(copied->valueForTime(2.5)));
+  }
+
+  // Events keep the curve alive after the caller releases it
+  shared_curve.reset();
+  CHECK(params[0]->valueForTime(1.0) == Approx(copied->valueForTime(1.0)));
+
+  CHECK_THROWS_AS(copied->setValueCurveAtTime(nullptr, 5.0, 1.0), std::invalid_argument);
+  auto single_value = std::make_shared<const std::vector<float>>(std::vector<float>{1.0f});
+  CHECK_THROWS_AS(copied->setValueCurveAtTime(single_value, 5.0, 1.0), std::invalid_argument);
+}
+
+TEST_CASE("Tempo maps should convert between beats and seconds") {
+  auto tempo_map = nativeformat::param::createTempoMap(120.0);
+  CHECK(tempo_map->secondsForBeat(4.0) == Approx(2.0));
+
+  // Drop to 60 bpm at beat 4, then ramp up by 15 bpm per beat to 120 bpm at beat 8
+  tempo_map->setTempoAtBeat(60.0, 4.0);
+  tempo_map->linearRampToTempoAtBeat(120.0, 8.0);
+  CHECK(tempo_map->secondsForBeat(6.0) == Approx(2.0 + 4.0 * std::log(1.5)));
+  CHECK(tempo_map->tempoAtBeat(7.0) == Approx(105.0));
+
+  // The ramp takes 60 / 15 * ln(2) seconds, then 120 bpm is held
+  double ramp_end = 2.0 + 4.0 * std::log(2.0);
+  CHECK(tempo_map->secondsForBeat(8.0) == Approx(ramp_end));
+  CHECK(tempo_map->secondsForBeat(10.0) == Approx(ramp_end + 1.0));
+
+  for (double beat : {1.0, 5.0, 7.5, 9.0}) {
+    CHECK(tempo_map->beatForSeconds(tempo_map->secondsForBeat(beat)) == Approx(beat));
+  }
+  CHECK_THROWS_AS(tempo_map->setTempoAtBeat(0.0, 2.0), std::invalid_argument);
+
+  // A change moves the beats from the previous tempo point, and old versions move every beat
+  uint64_t version = tempo_map->version();
+  tempo_map->setTempoAtBeat(90.0, 12.0);
+  CHECK(tempo_map->earliestChangedBeatSince(version) == Approx(8.0));
+  for (int i = 0; i < 100; ++i) {
+    tempo_map->setTempoAtBeat(90.0 + i, 12.0);
+  }
+  CHECK(tempo_map->earliestChangedBeatSince(version) ==
+        -std::numeric_limits<double>::infinity());
+  CHECK(tempo_map->earliestChangedBeatSince(tempo_map->version()) ==
+        std::numeric_limits<double>::infinity());
+}
+
+TEST_CASE("Events scheduled in beats should follow tempo changes") {
+  auto tempo_map = nativeformat::param::createTempoMap(120.0);
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, 0.0f, "testParam");
+  CHECK_THROWS_AS(p->setValueAtBeat(1.0f, 2.0), std::logic_error);
+
+  p->setTempoMap(tempo_map);
+  p->setValueAtBeat(1.0f, 2.0);
+  p->linearRampToValueAtBeat(3.0f, 6.0);
+  CHECK(p->valueForTime(2.0) == Approx(2.0f));
+  CHECK(p->valueForBeat(4.0) == Approx(2.0f));
+
+  // Halving the tempo from beat 4 moves the end of the ramp from 3 to 4 seconds
+  tempo_map->setTempoAtBeat(60.0, 4.0);
+  CHECK(p->valueForTime(0.5) == Approx(0.0f));
+  CHECK(p->valueForTime(1.0) == Approx(1.0f));
+  CHECK(p->valueForTime(2.5) == Approx(2.0f));
+  CHECK(p->valueForTime(4.0) == Approx(3.0f));
+
+  // Ramps stay linear in seconds between their remapped anchors
+  CHECK(p->valueForBeat(4.0) == Approx(1.0f + 2.0f / 3.0f));
+
+  // Beat 2 is at 1 second and beat 6 at 4 seconds
+  size_t count = 4;
+  std::vector<float> values(count);
+  std::vector<float> expected_values{1.0f, 1.66667f, 2.33333f, 3.0f};
+  p->valuesForBeatRange(values.data(), count, 2.0, 6.0);
+  for (size_t i = 0; i < count; ++i) {
+    CHECK(values[i] == Approx(expected_values[i]));
+  }
+}
+
+TEST_CASE("Events scheduled in beats should stay in order with events scheduled in seconds") {
+  auto tempo_map = nativeformat::param::createTempoMap(120.0);
+  auto p = nativeformat::param::createParam(0.0f, 10.0f, 0.0f, "testParam");
+  p->setTempoMap(tempo_map);
+  p->setValueAtBeat(5.0f, 4.0);
+  p->setValueAtTime(7.0f, 3.0);
+  p->setValueAtBeat(2.0f, 10.0);
+  p->setValueCurveAtTime(std::vector<float>{8.0f, 8.0f}, 9.0, 2.0);
+  CHECK(p->cumulativeValueForTimeRange(2.0, 3.0, 0.01) == Approx(5.0f));
+
+  // Halving the tempo moves beat 4 past 3 seconds, and beat 10 into the curve
+  tempo_map->setTempoAtBeat(60.0, 0.0);
+  CHECK(p->cumulativeValueForTimeRange(2.0, 3.0, 0.01) == Approx(0.0f));
+  CHECK(p->valueForTime(2.5) == Approx(0.0f));
+  CHECK(p->valueForTime(3.5) == Approx(7.0f));
+  CHECK(p->valueForTime(4.5) == Approx(5.0f));
+  CHECK(p->valueForTime(8.5) == Approx(5.0f));
+  CHECK(p->valueForTime(10.5) == Approx(8.0f));
+  CHECK(p->valueForTime(11.5) == Approx(0.0f));
+
+  // The curve starts first, so beat 10 is ignored until the tempo makes room for it again
+  tempo_map->setTempoAtBeat(120.0, 0.0);
+  CHECK(p->valueForTime(4.5) == Approx(7.0f));
+  CHECK(p->valueForTime(5.5) == Approx(2.0f));
+  CHECK(p->valueForTime(10.5) == Approx(8.0f));
+
+  // Cancelling removes ignored events too
+  tempo_map->setTempoAtBeat(60.0, 0.0);
+  p->cancelScheduledValues(9.5);
+  tempo_map->setTempoAtBeat(120.0, 0.0);
+  CHECK(p->valueForTime(5.5) == Approx(7.0f));
+  CHECK(p->valueForTime(10.5) == Approx(8.0f));
+}
+
+TEST_CASE("Value curves scheduled in beats should stretch with the tempo") {
+  auto tempo_map = nativeformat::param::createTempoMap(60.0);
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, 0.0f, "testParam");
+  p->setTempoMap(tempo_map);
+  auto curve = std::make_shared<const std::vector<float>>(std::vector<float>{0.0f, 2.0f, 4.0f});
+  p->setValueCurveAtBeat(curve, 1.0, 2.0);
+  float value = p->valueForBeat(2.5);
+
+  tempo_map->setTempoAtBeat(120.0, 0.0);
+  CHECK(p->valueForTime(1.25) == Approx(value));
+  CHECK(p->valueForBeat(2.5) == Approx(value));
+
+  auto single_value = std::make_shared<const std::vector<float>>(std::vector<float>{1.0f});
+  CHECK_THROWS_AS(p->setValueCurveAtBeat(single_value, 4.0, 1.0), std::invalid_argument);
+}
+
+TEST_CASE("Clones should share the template's events until they are edited") {
+  auto envelope = nativeformat::param::createParam(0.0f, 1.0f, 0.0f, "testParam");
+  envelope->setValueAtTime(0.0f, 0.0);
+  envelope->linearRampToValueAtTime(1.0f, 1.0);
+  envelope->linearRampToValueAtTime(0.5f, 2.0);
+
+  auto voice = envelope->clone(10.0);
+  CHECK(voice->name() == envelope->name());
+  CHECK(voice->valueForTime(5.0) == Approx(0.0f));
+  CHECK(voice->valueForTime(10.5) == Approx(0.5f));
+  CHECK(voice->valueForTime(11.5) == Approx(0.75f));
+
+  // A block that starts before the clone's offset renders the default value until it
+  size_t count = 5;
+  std::vector<float> values(count);
+  std::vector<float> expected_values{0.0f, 0.0f, 0.0f, 0.5f, 1.0f};
+  voice->valuesForTimeRange(values.data(), count, 9.0, 11.0);
+  for (size_t i = 0; i < count; ++i) {
+    CHECK(values[i] == Approx(expected_values[i]));
+  }
+
+  // Editing the clone leaves the template and its other clones as they were
+  auto other_voice = envelope->clone(20.0);
+  voice->cancelAndHoldAtTime(10.5);
+  voice->linearRampToValueAtTime(0.0f, 11.0);
+  CHECK(voice->valueForTime(10.75) == Approx(0.25f));
+  CHECK(envelope->valueForTime(0.75) == Approx(0.75f));
+  CHECK(other_voice->valueForTime(20.75) == Approx(0.75f));
+
+  // Editing the template leaves its clones as they were
+  envelope->setValueAtTime(0.0f, 3.0);
+  CHECK(envelope->valueForTime(3.5) == Approx(0.0f));
+  CHECK(other_voice->valueForTime(23.5) == Approx(0.5f));
+
+  // Offsets add up, and custom functions are called in the time they were scheduled in
+  auto nested_voice = other_voice->clone(1.0);
+  nested_voice->addCustomEvent(
+      30.0, 31.0, nativeformat::param::Anchor::ALL, [](double time) { return time - 30.0; });
+  CHECK(nested_voice->valueForTime(21.75) == Approx(0.75f));
+  CHECK(nested_voice->valueForTime(30.5) == Approx(0.5f));
+}
+
+TEST_CASE("LFOs should oscillate between -1 and 1") {
+  auto sine = nativeformat::param::createLFO(nativeformat::param::Waveform::SINE, 2.0f, "sine");
+  auto triangle =
+      nativeformat::param::createLFO(nativeformat::param::Waveform::TRIANGLE, 2.0f, "triangle");
+  auto square =
+      nativeformat::param::createLFO(nativeformat::param::Waveform::SQUARE, 2.0f, "square");
+  auto sawtooth =
+      nativeformat::param::createLFO(nativeformat::param::Waveform::SAWTOOTH, 2.0f, "sawtooth");
+  std::vector<float> expected_sine{0.0f, 1.0f, 0.0f, -1.0f, 0.0f};
+  std::vector<float> expected_triangle{0.0f, 1.0f, 0.0f, -1.0f, 0.0f};
+  std::vector<float> expected_square{1.0f, 1.0f, -1.0f, -1.0f, 1.0f};
+  std::vector<float> expected_sawtooth{0.0f, 0.5f, -1.0f, -0.5f, 0.0f};
+
+  // A quarter cycle at 2 Hz is 0.125 seconds
+  size_t count = 5;
+  std::vector<float> values(count);
+  sine->valuesForTimeRange(values.data(), count, 0.0, 0.5);
+  for (size_t i = 0; i < count; ++i) {
+    CHECK(values[i] == Approx(expected_sine[i]).margin(1e-6));
+    CHECK(sine->valueForTime(i * 0.125) == Approx(expected_sine[i]).margin(1e-6));
+    CHECK(triangle->valueForTime(i * 0.125) == Approx(expected_triangle[i]));
+    CHECK(square->valueForTime(i * 0.125) == Approx(expected_square[i]));
+    CHECK(sawtooth->valueForTime(i * 0.125) == Approx(expected_sawtooth[i]));
+  }
+}
+
+TEST_CASE("Modulation sources should be rendered once per range in dependency order") {
+  auto lfo = nativeformat::param::createLFO(nativeformat::param::Waveform::SQUARE, 1.0f, "lfo");
+  auto first = nativeformat::param::createParam(0.0f, 10.0f, -10.0f, "first");
+  auto second = nativeformat::param::createParam(1.0f, 10.0f, -10.0f, "second");
+  auto p = nativeformat::param::createParam(0.0f, 4.0f, 0.0f, "testParam");
+  first->setValueAtTime(0.0f, 0.0);
+  first->linearRampToValueAtTime(2.0f, 1.0);
+  first->connectModulation(lfo, 0.5f);
+  second->connectModulation(lfo, -1.0f, 1.0f);
+  p->connectModulation(first, 1.0f);
+  p->connectModulation(second, 0.5f);
+
+  // The LFO is 1 then -1, so first is ramp + 0.5 then ramp - 0.5 and second is 1 then 3
+  size_t count = 5;
+  std::vector<float> values(count);
+  std::vector<float> expected_values{1.0f, 1.5f, 2.0f, 2.5f, 3.0f};
+  lfo->setRenderCacheCapacity(count);
+  p->valuesForTimeRange(values.data(), count, 0.0, 1.0);
+  for (size_t i = 0; i < count; ++i) {
+    CHECK(values[i] == Approx(expected_values[i]));
+    CHECK(p->valueForTime(i * 0.25) == Approx(expected_values[i]));
+  }
+  CHECK(lfo->renderCacheStatistics().misses == 1);
+  CHECK(lfo->renderCacheStatistics().hits == 0);
+
+  // Modulated values are clamped to the param's range
+  p->connectModulation(second, 1.0f);
+  CHECK(p->valueForTime(0.875) == Approx(4.0f));
+  p->disconnectModulation(second);
+  CHECK(p->valueForTime(0.75) == Approx(1.0f));
+
+  CHECK_THROWS_AS(lfo->connectModulation(p, 1.0f), std::invalid_argument);
+  CHECK_THROWS_AS(p->connectModulation(p, 1.0f), std::invalid_argument);
+}
+
+TEST_CASE("Real-time scheduling should only use reserved events and return errors") {
+  using nativeformat::param::ScheduleResult;
+  auto p = nativeformat::param::createParam(0.0f, 1.0f, 0.0f, "testParam");
+  CHECK(p->trySetValueAtTime(0.5f, 0.0) == ScheduleResult::OUT_OF_CAPACITY);
+
+  p->reserveEvents(4);
+  CHECK(p->trySetValueAtTime(0.0f, 0.0) == ScheduleResult::SCHEDULED);
+  CHECK(p->tryLinearRampToValueAtTime(1.0f, 1.0) == ScheduleResult::SCHEDULED);
+  CHECK(p->valueForTime(0.5) == Approx(0.5f));
+
+  // A ramp takes two events and only one is left, so nothing is scheduled
+  CHECK(p->tryLinearRampToValueAtTime(0.0f, 2.0) == ScheduleResult::OUT_OF_CAPACITY);
+  CHECK(p->valueForTime(1.5) == Approx(1.0f));
+
+  auto curve = std::make_shared<const std::vector<float>>(std::vector<float>{0.0f, 1.0f});
+  CHECK(p->trySetValueCurveAtTime(curve, 0.5, 1.0) == ScheduleResult::CONFLICT);
+  CHECK(p->trySetValueCurveAtTime(nullptr, 2.0, 1.0) == ScheduleResult::INVALID_ARGUMENT);
+  auto short_curve = std::make_shared<const std::vector<float>>(std::vector<float>{1.0f});
+  CHECK(p->trySetValueCurveAtTime(short_curve, 2.0, 1.0) == ScheduleResult::INVALID_ARGUMENT);
+
+  // Cancelled events can be scheduled again
+  p->cancelScheduledValues(0.5);
+  CHECK(p->tryLinearRampToValueAtTime(1.0f, 1.0) == ScheduleResult::SCHEDULED);
+  CHECK(p->tryCancelAndHoldAtTime(0.5) == ScheduleResult::OUT_OF_CAPACITY);
+  CHECK(p->valueForTime(0.75) == Approx(0.75f));
+  p->reserveEvents(2);
+  CHECK(p->tryCancelAndHoldAtTime(0.5) == ScheduleResult::SCHEDULED);
+  CHECK(p->valueForTime(0.25) == Approx(0.25f));
+  CHECK(p->valueForTime(0.75) == Approx(0.5f));
+
+  // A clone needs its own reserved events, as its first edit copies the shared events
+  auto voice = p->clone(1.0);
+  CHECK(voice->trySetValueAtTime(0.0f, 2.0) == ScheduleResult::OUT_OF_CAPACITY);
+  voice->reserveEvents(1);
+  CHECK(voice->trySetValueAtTime(0.0f, 2.0) == ScheduleResult::SCHEDULED);
+  CHECK(voice->valueForTime(1.75) == Approx(0.5f));
+  CHECK(voice->valueForTime(2.5) == Approx(0.0f));
+  CHECK(p->valueForTime(1.5) == Approx(0.5f));
+
+  // Moving events to a changed tempo map is left to the next call that is not a try* method
+  auto tempo_map = nativeformat::param::createTempoMap(120.0);
+  voice->setTempoMap(tempo_map);
+  voice->reserveEvents(1);
+  tempo_map->setTempoAtBeat(60.0, 0.0);
+  CHECK(voice->trySetValueAtTime(1.0f, 3.0) == ScheduleResult::TEMPO_MAP_CHANGED);
+  CHECK(voice->valueForTime(3.5) == Approx(0.0f));
+  CHECK(voice->trySetValueAtTime(1.0f, 3.0) == ScheduleResult::SCHEDULED);
+  CHECK(voice->valueForTime(3.5) == Approx(1.0f));
+}
+
+TEST_CASE("Real-time scheduling should never free memory or lose its reserved events") {
+  using nativeformat::param::ScheduleResult;
+  auto p = nativeformat::param::createParam(0.0f, 1.0f, 0.0f, "testParam");
+  p->reserveEvents(4);
+
+  // Scheduling from other threads does not use the reserved events
+  p->setValueAtTime(0.0f, 0.0);
+  p->linearRampToValueAtTime(1.0f, 1.0);
+  p->setValueAtTime(0.5f, 2.0);
+
+  // Removing the events scheduled on the heap would free them
+  CHECK(p->tryCancelAndHoldAtTime(0.5) == ScheduleResult::OUT_OF_CAPACITY);
+  CHECK(p->valueForTime(0.75) == Approx(0.75f));
+  CHECK(p->valueForTime(2.5) == Approx(0.5f));
+
+  p->cancelScheduledValues(1.0);
+  CHECK(p->tryLinearRampToValueAtTime(0.0f, 3.0) == ScheduleResult::SCHEDULED);
+  CHECK(p->tryCancelAndHoldAtTime(2.0) == ScheduleResult::SCHEDULED);
+  CHECK(p->valueForTime(2.5) == Approx(p->valueForTime(2.0)));
+
+  // Removing the last reference to a shared curve would free it
+  auto q = nativeformat::param::createParam(0.0f, 1.0f, 0.0f, "testParam");
+  q->reserveEvents(2);
+  auto curve = std::make_shared<const std::vector<float>>(std::vector<float>{0.0f, 1.0f});
+  CHECK(q->trySetValueCurveAtTime(curve, 1.0, 1.0) == ScheduleResult::SCHEDULED);
+  std::weak_ptr<const std::vector<float>> weak_curve = curve;
+  curve.reset();
+  CHECK(q->tryCancelAndHoldAtTime(0.5) == ScheduleResult::OUT_OF_CAPACITY);
+  CHECK(q->valueForTime(1.5) == Approx(0.5f));
+  curve = weak_curve.lock();
+  CHECK(q->tryCancelAndHoldAtTime(0.5) == ScheduleResult::SCHEDULED);
+  CHECK(q->valueForTime(1.5) == Approx(0.0f));
+}